@@ -0,0 +1,249 @@
+#! python
+"""Command line interface for benchmarking the reducer and the recommender."""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported.
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+from src import MovieDatasetReducer, MovieRecommender
+from src.movie_recommender import SIMILARITY_MODES
+from src.synthetic import make_reduced_dataset, write_synthetic_dumps
+
+# The dense mode holds an n x n float64 matrix; skip it above this size.
+DENSE_LIMIT = 20000
+
+
+def _peak_rss_mb() -> float | None:
+    """Return the peak resident set size of this process in MiB, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _bench_reduce(directory: str, percentage: float) -> dict:
+    """Reduce the dumps in ``directory`` and report throughput and memory."""
+    os.chdir(directory)
+    with open("title.basics.tsv", "rb") as handle:
+        rows = sum(1 for _ in handle) - 1
+    start = time.perf_counter()
+    reduced = MovieDatasetReducer().reduce_dataset(percentage, "reduced")
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "titles_per_second": rows / seconds,
+        "movies_written": len(reduced),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _bench_recommender(
+    dataset: str, similarity: str, queries: int, top_n: int, seed: int
+) -> dict:
+    """Load ``dataset`` and time ``queries`` random recommendations."""
+    baseline = _peak_rss_mb()
+    recommender = MovieRecommender(similarity=similarity, top_k=max(50, top_n))
+    start = time.perf_counter()
+    recommender.load_dataset(dataset)
+    load_seconds = time.perf_counter() - start
+    load_rss = _peak_rss_mb()
+
+    rng = np.random.default_rng(seed)
+    titles = recommender.df["title"].to_numpy()
+    sample = titles[rng.integers(0, len(titles), queries)]
+    # The first call builds the title index; keep it out of the latencies.
+    recommender.recommend(sample[0], top_n)
+    latencies = np.empty(queries)
+    for position, title in enumerate(sample):
+        start = time.perf_counter()
+        recommender.recommend(title, top_n)
+        latencies[position] = time.perf_counter() - start
+    return {
+        "load_seconds": load_seconds,
+        "load_rss_growth_mb": None if resource is None else load_rss - baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+        "recommend_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "recommend_p99_ms": 1000 * float(np.percentile(latencies, 99)),
+        "queries": queries,
+    }
+
+
+def _isolated(function, *args) -> dict:
+    """Run ``function`` in a fresh process so its peak RSS is its own."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def _environment() -> dict:
+    """Describe the commit and the software the results were measured with."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    scales: list[int],
+    similarities: list[str],
+    queries: int = 200,
+    top_n: int = 10,
+    percentage: float = 0.9,
+    reduce: bool = True,
+    seed: int = 0,
+) -> dict:
+    """Run every benchmark for every scale and return the results."""
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as tmpdir:
+            if reduce:
+                logging.info("Generating IMDb dumps with %s titles...", scale)
+                write_synthetic_dumps(tmpdir, scale, seed)
+                logging.info("Benchmarking reduce_dataset...")
+                measured = _isolated(_bench_reduce, tmpdir, percentage)
+                results.append({"benchmark": "reduce", "scale": scale, **measured})
+
+            logging.info("Generating a reduced dataset with %s movies...", scale)
+            dataset = Path(tmpdir) / "movies.csv"
+            make_reduced_dataset(scale, seed).to_csv(dataset)
+            for similarity in similarities:
+                if similarity == "dense" and scale > DENSE_LIMIT:
+                    logging.info("Skipping dense similarity at %s movies.", scale)
+                    continue
+                logging.info("Benchmarking the %s recommender...", similarity)
+                measured = _isolated(
+                    _bench_recommender, str(dataset), similarity, queries, top_n, seed
+                )
+                results.append(
+                    {
+                        "benchmark": "recommender",
+                        "scale": scale,
+                        "similarity": similarity,
+                        **measured,
+                    }
+                )
+    return {"environment": _environment(), "results": results}
+
+
+def compare(old: dict, new: dict) -> pd.DataFrame:
+    """Return the ratio new / old of every metric measured in both runs."""
+    keys = ["benchmark", "scale", "similarity"]
+    before = pd.DataFrame(old["results"])
+    after = pd.DataFrame(new["results"])
+    for frame in (before, after):
+        if "similarity" not in frame:
+            frame["similarity"] = None
+    metrics = [
+        column
+        for column in after.columns
+        if column not in keys and column in before.columns
+    ]
+    merged = before.merge(after, on=keys, suffixes=("_old", "_new"))
+    ratios = merged[keys].copy()
+    for metric in metrics:
+        # Metrics a platform does not report are None and compare as NaN.
+        new_values = merged[f"{metric}_new"].astype(float)
+        old_values = merged[f"{metric}_old"].astype(float)
+        ratios[metric] = new_values / old_values
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the reducer and the recommender on synthetic data"
+    )
+    parser.add_argument(
+        "-s",
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[10000, 100000],
+        help="Number of titles (and of reduced movies) to generate "
+        "(default: 10000 100000)",
+    )
+    parser.add_argument(
+        "--similarity",
+        nargs="+",
+        choices=SIMILARITY_MODES,
+        default=list(SIMILARITY_MODES),
+        help="Similarity modes to benchmark (default: all); dense is skipped "
+        f"above {DENSE_LIMIT} movies",
+    )
+    parser.add_argument(
+        "-q",
+        "--queries",
+        type=int,
+        default=200,
+        help="Recommendations timed per mode (default: 200)",
+    )
+    parser.add_argument(
+        "--skip-reduce",
+        action="store_true",
+        help="Only benchmark the recommender",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="benchmark.json",
+        help="JSON file the results are written to (default: benchmark.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="JSON",
+        help="Earlier results to compare against; prints new / old ratios",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    report = run_benchmarks(
+        args.scales,
+        args.similarity,
+        queries=args.queries,
+        reduce=not args.skip_reduce,
+        seed=args.seed,
+    )
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(pd.DataFrame(report["results"]).to_string(index=False))
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print()
+        print(compare(old, report).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
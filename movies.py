@@ -5,6 +5,7 @@ import argparse
 import logging
 
 from src import MovieDatasetReducer
+from src.dataset_reducer import OUTPUT_FORMATS
 
 
 def main():
@@ -13,18 +14,60 @@ def main():
         "-p",
         "--percentage",
         type=float,
-        default=0.90,
-        help="Quantile of votes to keep (e.g. 0.90 keeps top 10% of movies)",
+        nargs="+",
+        default=[0.90],
+        help="Quantile of votes to keep (e.g. 0.90 keeps top 10%% of movies). "
+        "Several quantiles are reduced in a single pass.",
     )
     parser.add_argument(
-        "-o", "--output", default="movies_10", help="Output filename without extension"
+        "-o",
+        "--output",
+        nargs="+",
+        help="Output filename without extension, one per percentage "
+        "(default: movies_<kept %%>, e.g. movies_10)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output format; npz keeps typed columns and loads faster (default: csv)",
+    )
+    parser.add_argument(
+        "--state",
+        help="State file for incremental refreshes; only changed movies are "
+        "re-joined on later runs (single percentage only)",
+    )
+    parser.add_argument(
+        "-i",
+        "--input-dir",
+        default=".",
+        help="Directory holding the IMDb dumps, either *.tsv or the *.tsv.gz "
+        "files as downloaded (default: current directory)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used to parse uncompressed dumps concurrently (default: 1)",
     )
     args = parser.parse_args()
+    outputs = args.output or [f"movies_{round((1 - p) * 100)}" for p in args.percentage]
+    if len(outputs) != len(args.percentage):
+        parser.error("pass one --output name per --percentage")
+    if args.state and len(args.percentage) > 1:
+        parser.error("--state supports a single --percentage")
 
     logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-    reducer = MovieDatasetReducer()
-    reducer.reduce_dataset(args.percentage, args.output)
+    reducer = MovieDatasetReducer(
+        output_format=args.format, workers=args.workers, input_dir=args.input_dir
+    )
+    if args.state:
+        reducer.update_dataset(args.percentage[0], outputs[0], args.state)
+    else:
+        reducer.reduce_datasets(args.percentage, outputs)
 
 
 if __name__ == "__main__":
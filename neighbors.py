@@ -0,0 +1,59 @@
+#! python
+"""Command line interface for precomputing the neighbors of every movie."""
+
+import argparse
+import logging
+import time
+
+from src import MovieRecommender
+from src.neighbors import NeighborTable
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the top-k neighbors of every movie in a dataset"
+    )
+    parser.add_argument("dataset", help="CSV or npz dataset produced by movies.py")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Directory the table is written to (default: <dataset>.neighbors)",
+    )
+    parser.add_argument(
+        "-k",
+        "--top-k",
+        type=int,
+        default=50,
+        help="Neighbors stored per movie (default: 50)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes computing similarity blocks concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        help="Movies per similarity block (default: about 64 MB per block)",
+    )
+    args = parser.parse_args()
+    output = args.output or f"{args.dataset.rsplit('.', 1)[0]}.neighbors"
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Only the feature matrix is needed, not any similarity data.
+    recommender = MovieRecommender()
+    features = recommender.load_features(args.dataset)
+    logging.info("Computing neighbors of %s movies...", features.shape[0])
+    start = time.perf_counter()
+    # The movie itself usually ranks first, so keep one extra entry.
+    table = NeighborTable.build(features, args.top_k + 1, args.block_size, args.workers)
+    logging.info("Done in %.1f s.", time.perf_counter() - start)
+    table.save(output, top_k=args.top_k, dataset_hash=recommender.dataset_hash)
+    logging.info("Neighbor table written to %s.", output)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,24 +3,192 @@
 
 import argparse
 import logging
+import sys
+from collections.abc import Iterator
+from typing import TextIO
 
 from src import MovieRecommender
+from src.ann_index import recall_report
+from src.movie_recommender import SIMILARITY_MODES
+
+
+BATCH_FORMATS = ("jsonl", "csv")
+
+
+def read_titles(handle: TextIO) -> Iterator[str]:
+    """Yield the non-empty lines of ``handle`` as titles."""
+    for line in handle:
+        title = line.strip()
+        if title:
+            yield title
+
+
+def write_batch(
+    recommender: MovieRecommender,
+    titles: Iterator[str],
+    output: TextIO,
+    output_format: str = "jsonl",
+    top_n: int = 10,
+    batch_size: int | None = None,
+) -> tuple[int, int]:
+    """Stream recommendations for ``titles`` to ``output`` as they are ranked.
+
+    Every record holds one recommendation, or the error of a title that was
+    not found, with the ``query``, ``rank``, ``title``, ``score`` and
+    ``error`` fields. Returns the number of titles read and of failures.
+    """
+    read = 0
+
+    def counted() -> Iterator[str]:
+        nonlocal read
+        for title in titles:
+            read += 1
+            yield title
+
+    failures = 0
+    frames = recommender.iter_recommendations(counted(), top_n, batch_size)
+    for number, frame in enumerate(frames):
+        if output_format == "csv":
+            frame.to_csv(output, header=number == 0, index=False)
+        else:
+            output.write(frame.to_json(orient="records", lines=True, force_ascii=False))
+        output.flush()
+        failures += int(frame["error"].notna().sum())
+    return read, failures
 
 
 def main():
     parser = argparse.ArgumentParser(description="Recommend movies from a dataset")
     parser.add_argument("dataset", help="CSV dataset produced by movies.py")
-    parser.add_argument("title", nargs="?", help="Movie title to search for")
+    parser.add_argument(
+        "titles",
+        nargs="*",
+        metavar="title",
+        help="Movie titles to search for; several titles are combined",
+    )
+    parser.add_argument(
+        "-n",
+        "--top-n",
+        type=int,
+        default=10,
+        help="Recommendations per title (default: 10)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Read one title per line from FILE ('-' for stdin), load the model "
+        "once and stream recommendations for each title to stdout",
+    )
+    parser.add_argument(
+        "--batch-format",
+        choices=BATCH_FORMATS,
+        default="jsonl",
+        help="Output format of --batch (default: jsonl)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Titles ranked together with --batch (default: sized to the dataset)",
+    )
+    parser.add_argument(
+        "--similarity",
+        choices=SIMILARITY_MODES,
+        default="dense",
+        help="How movie similarities are stored (default: dense)",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=50,
+        help="Neighbors kept per movie with --similarity topk",
+    )
+    parser.add_argument(
+        "--ann-bands",
+        type=int,
+        default=32,
+        help="MinHash bands with --similarity ann (default: 32)",
+    )
+    parser.add_argument(
+        "--ann-rows",
+        type=int,
+        default=2,
+        help="MinHash values per band with --similarity ann (default: 2)",
+    )
+    parser.add_argument(
+        "--ann-candidates",
+        type=int,
+        default=200,
+        help="Candidates scored per query with --similarity ann (default: 200)",
+    )
+    parser.add_argument(
+        "--recall-report",
+        type=int,
+        metavar="N",
+        help="Print the recall@10 of --similarity ann on N sampled movies and exit",
+    )
+    parser.add_argument(
+        "--model",
+        help="Directory of a saved model; rebuilt when the dataset has changed",
+    )
+    parser.add_argument(
+        "--neighbors",
+        metavar="DIR",
+        help="Neighbor table written by neighbors.py for the dataset; implies "
+        "--similarity topk and serves recommendations from it",
+    )
     args = parser.parse_args()
+    if args.neighbors:
+        if args.model:
+            parser.error("--neighbors cannot be combined with --model")
+        args.similarity = "topk"
+    if args.batch and args.titles:
+        parser.error("--batch cannot be combined with titles")
 
     logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-    recommender = MovieRecommender()
-    recommender.load_dataset(args.dataset)
+    options = {
+        "similarity": args.similarity,
+        "top_k": args.top_k,
+        "ann_bands": args.ann_bands,
+        "ann_rows": args.ann_rows,
+        "ann_candidates": args.ann_candidates,
+    }
+    if args.model:
+        recommender = MovieRecommender.load_or_build(
+            args.dataset, args.model, **options
+        )
+    else:
+        recommender = MovieRecommender(**options)
+        recommender.load_dataset(args.dataset, args.neighbors)
+
+    if args.recall_report:
+        settings = [recommender.ann_options]
+        report = recall_report(
+            recommender.features, settings, sample_size=args.recall_report
+        )
+        print(report.to_string(index=False))
+        return
+
+    if args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        with source:
+            read, failures = write_batch(
+                recommender,
+                read_titles(source),
+                sys.stdout,
+                args.batch_format,
+                args.top_n,
+                args.batch_size,
+            )
+        logging.info("Answered %s titles, %s not found.", read - failures, failures)
+        return
 
-    title = args.title or input("What movie would you like a recommendation for? ")
+    titles = args.titles or [input("What movie would you like a recommendation for? ")]
     try:
-        recommendations = recommender.recommend(title)
+        if len(titles) == 1:
+            recommendations = recommender.recommend(titles[0], args.top_n)
+        else:
+            recommendations = recommender.recommend(top_n=args.top_n, titles=titles)
         print(recommendations)
     except ValueError as exc:
         print(exc)
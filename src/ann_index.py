@@ -0,0 +1,169 @@
+"""Approximate nearest neighbor search with MinHash locality sensitive hashing."""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .neighbors import top_k_indices
+
+# Mersenne prime used by the universal hash family; products stay in int64.
+_PRIME = (1 << 31) - 1
+# Upper bound for the token x permutation hash block computed at once.
+_BLOCK_BYTES = 64 * 2**20
+
+
+class MinHashLSHIndex:
+    """Bucket movies whose soup token sets have a high Jaccard similarity.
+
+    Every movie gets ``bands * rows`` MinHash values; two movies become
+    candidates when all ``rows`` values of at least one band agree. More
+    bands or fewer rows per band raise recall at the cost of larger candidate
+    sets. Candidates are ranked by the number of shared bands and at most
+    ``max_candidates`` of them are returned.
+    """
+
+    def __init__(
+        self, bands: int = 32, rows: int = 2, max_candidates: int = 200, seed: int = 0
+    ) -> None:
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, bands * rows, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, bands * rows, dtype=np.int64)
+        self._multipliers = rng.integers(1, 2**63, rows, dtype=np.uint64) | 1
+        self.keys = None
+        self.order = None
+        self.sorted_keys = None
+
+    def fit(self, features: sparse.spmatrix) -> "MinHashLSHIndex":
+        """Index the token sets given by the non-zero columns of ``features``."""
+        self.keys = self._band_keys(self.signatures(features))
+        self.order = np.argsort(self.keys, axis=1, kind="stable")
+        self.sorted_keys = np.take_along_axis(self.keys, self.order, axis=1)
+        return self
+
+    def update(self, features: sparse.spmatrix, rows: np.ndarray) -> "MinHashLSHIndex":
+        """Re-index ``rows`` of ``features``; rows past the index are added."""
+        features = sparse.csr_matrix(features)
+        keys = np.empty((self.bands, features.shape[0]), dtype=np.uint64)
+        keys[:, : self.keys.shape[1]] = self.keys
+        keys[:, rows] = self._band_keys(self.signatures(features[rows]))
+        self.keys = keys
+        self.order = np.argsort(self.keys, axis=1, kind="stable")
+        self.sorted_keys = np.take_along_axis(self.keys, self.order, axis=1)
+        return self
+
+    def signatures(self, features: sparse.spmatrix) -> np.ndarray:
+        """Return the ``(n, bands * rows)`` MinHash signatures of ``features``."""
+        features = sparse.csr_matrix(features)
+        n = features.shape[0]
+        permutations = self.bands * self.rows
+        signatures = np.full((n, permutations), _PRIME, dtype=np.int64)
+        tokens_per_block = max(1, _BLOCK_BYTES // (permutations * 8))
+        start = 0
+        while start < n:
+            # Grow the block until it holds about ``tokens_per_block`` tokens.
+            first = features.indptr[start]
+            end = int(
+                np.searchsorted(features.indptr, first + tokens_per_block, "right")
+            )
+            end = min(max(end - 1, start + 1), n)
+            indptr = features.indptr[start : end + 1] - first
+            tokens = features.indices[first : features.indptr[end]].astype(np.int64)
+            if tokens.size:
+                hashes = (tokens[:, None] * self._a + self._b) % _PRIME
+                filled = np.flatnonzero(np.diff(indptr))
+                signatures[start + filled] = np.minimum.reduceat(
+                    hashes, indptr[filled], axis=0
+                )
+            start = end
+        return signatures
+
+    def candidates(self, row: int) -> np.ndarray:
+        """Return sorted row indices that share at least one band with ``row``."""
+        found = []
+        for band in range(self.bands):
+            key = self.keys[band, row]
+            keys = self.sorted_keys[band]
+            lo = np.searchsorted(keys, key, "left")
+            hi = np.searchsorted(keys, key, "right")
+            found.append(self.order[band, lo:hi])
+        found = np.concatenate(found)
+        if found.size == 0:
+            return found
+        rows, hits = np.unique(found, return_counts=True)
+        if rows.size > self.max_candidates:
+            best = top_k_indices(hits[None, :], self.max_candidates)[0]
+            rows = np.sort(rows[best])
+        return rows
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Hash the ``rows`` values of each band into one ``uint64`` key."""
+        n = signatures.shape[0]
+        bands = signatures.reshape(n, self.bands, self.rows).astype(np.uint64)
+        keys = (bands * self._multipliers).sum(axis=2, dtype=np.uint64)
+        return np.ascontiguousarray(keys.T)
+
+
+def recall_report(
+    features: sparse.spmatrix,
+    settings: list[dict],
+    k: int = 10,
+    sample_size: int = 200,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Compare approximate against exact recommendations on a sample.
+
+    ``features`` is the L2-normalized feature matrix of
+    :class:`MovieRecommender` and each entry of ``settings`` holds
+    :class:`MinHashLSHIndex` keyword arguments. The report has one row per
+    setting with the mean recall@k, the mean candidate count and the mean
+    query time in milliseconds. Approximate neighbors tied with the k-th
+    exact neighbor count as hits.
+    """
+    features = sparse.csr_matrix(features)
+    features_t = features.T.tocsr()
+    n = features.shape[0]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(sample_size, n), replace=False)
+    exact = (features[sample] @ features_t).toarray()
+    kth = np.take_along_axis(exact, top_k_indices(exact, k + 1)[:, -1:], axis=1)[:, 0]
+    report = []
+    for options in settings:
+        index = MinHashLSHIndex(**options).fit(features)
+        hits, sizes, elapsed = 0, 0, 0.0
+        for row, threshold in zip(sample, kth):
+            start = time.perf_counter()
+            _, scores = approximate_top_k(features, index, row, k)
+            elapsed += time.perf_counter() - start
+            sizes += index.candidates(row).size
+            hits += min(k, int(np.count_nonzero(scores >= threshold)))
+        report.append(
+            {
+                **options,
+                f"recall@{k}": hits / (len(sample) * k),
+                "candidates": sizes / len(sample),
+                "query_ms": 1000 * elapsed / len(sample),
+            }
+        )
+    return pd.DataFrame(report)
+
+
+def approximate_top_k(
+    features: sparse.csr_matrix, index: MinHashLSHIndex, row: int, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the ``k`` best candidates of ``row`` ranked by exact cosine.
+
+    Like the exact path, the best match (normally ``row`` itself) is
+    dropped. Fewer than ``k`` indices are returned when the buckets hold too
+    few candidates.
+    """
+    candidates = index.candidates(row)
+    scores = (features[row] @ features[candidates].T).toarray()
+    top = top_k_indices(scores, k + 1)[0, 1:]
+    return candidates[top], scores[0, top]
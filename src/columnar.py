@@ -0,0 +1,175 @@
+"""Helpers for storing string and list columns in flat, typed arrays."""
+
+from __future__ import annotations
+
+import itertools
+import json
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Array types rebuilding nullable numeric columns from values and a mask.
+_MASKED_ARRAYS = {
+    "b": pd.arrays.BooleanArray,
+    "i": pd.arrays.IntegerArray,
+    "u": pd.arrays.IntegerArray,
+    "f": pd.arrays.FloatingArray,
+}
+
+
+def encode_strings(values: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Encode ``values`` as ``(offsets, data)`` arrays.
+
+    ``data`` holds the UTF-8 bytes of all strings back to back and string
+    ``i`` spans ``data[offsets[i]:offsets[i + 1]]``.
+    """
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def decode_strings(offsets: np.ndarray, data: np.ndarray) -> list[str]:
+    """Inverse of :func:`encode_strings`."""
+    raw = np.asarray(data).tobytes()
+    bounds = np.asarray(offsets).tolist()
+    return [
+        raw[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def write_columnar(path: str | Path, df: pd.DataFrame) -> Path:
+    """Write ``df`` to an uncompressed ``.npz`` bundle.
+
+    Numeric columns are stored as typed arrays, categorical columns as codes,
+    and string columns and columns holding lists of strings are
+    offset-encoded, so nothing has to be parsed or re-split when the bundle is
+    read back with :func:`read_columnar`.
+    """
+    arrays = {}
+    schema = _encode_frame(df, "", arrays)
+    arrays["__schema__"] = _encode_json(schema)
+    return _save_bundle(path, arrays)
+
+
+def read_columnar(path: str | Path) -> pd.DataFrame:
+    """Read a bundle written by :func:`write_columnar`."""
+    with np.load(path, allow_pickle=False) as bundle:
+        schema = _decode_json(bundle["__schema__"])
+        return _decode_frame(bundle, schema, "")
+
+
+def write_tables(
+    path: str | Path, tables: dict[str, pd.DataFrame], metadata: dict | None = None
+) -> Path:
+    """Write several named frames and JSON ``metadata`` to one bundle."""
+    arrays = {}
+    layout = {
+        name: _encode_frame(df, f"{name}:", arrays) for name, df in tables.items()
+    }
+    arrays["__tables__"] = _encode_json({"tables": layout, "metadata": metadata or {}})
+    return _save_bundle(path, arrays)
+
+
+def read_tables(path: str | Path) -> tuple[dict[str, pd.DataFrame], dict]:
+    """Read a bundle written by :func:`write_tables`."""
+    with np.load(path, allow_pickle=False) as bundle:
+        layout = _decode_json(bundle["__tables__"])
+        tables = {
+            name: _decode_frame(bundle, schema, f"{name}:")
+            for name, schema in layout["tables"].items()
+        }
+    return tables, layout["metadata"]
+
+
+def _encode_frame(
+    df: pd.DataFrame, prefix: str, arrays: dict[str, np.ndarray]
+) -> dict[str, str]:
+    """Add the arrays encoding ``df`` to ``arrays`` and return its schema."""
+    schema = {}
+    for name in df.columns:
+        key = f"{prefix}{name}"
+        column = df[name]
+        nulls = column.isna().to_numpy()
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Codes plus the distinct values; missing values have code -1.
+            schema[name] = "category"
+            arrays[f"{key}.codes"] = column.cat.codes.to_numpy()
+            categories = column.cat.categories
+            arrays[f"{key}.offsets"], arrays[f"{key}.data"] = encode_strings(categories)
+            continue
+        if hasattr(column.dtype, "numpy_dtype"):
+            # Nullable dtypes such as ``Int64`` keep their type and their mask.
+            schema[name] = "masked"
+            arrays[f"{key}.values"] = column.to_numpy(
+                column.dtype.numpy_dtype, na_value=0
+            )
+            arrays[f"{key}.nulls"] = nulls
+            continue
+        if pd.api.types.is_numeric_dtype(column):
+            schema[name] = "numeric"
+            arrays[f"{key}.values"] = column.to_numpy()
+            continue
+        if nulls.any():
+            arrays[f"{key}.nulls"] = nulls
+        valid = column[~nulls]
+        if len(valid) and pd.api.types.is_list_like(valid.iloc[0]):
+            schema[name] = "list"
+            lengths = [0 if null else len(value) for value, null in zip(column, nulls)]
+            list_offsets = np.zeros(len(column) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=list_offsets[1:])
+            arrays[f"{key}.list_offsets"] = list_offsets
+            values = itertools.chain.from_iterable(valid)
+        else:
+            schema[name] = "string"
+            values = column.where(~nulls, "")
+        arrays[f"{key}.offsets"], arrays[f"{key}.data"] = encode_strings(values)
+    return schema
+
+
+def _decode_frame(bundle, schema: dict[str, str], prefix: str) -> pd.DataFrame:
+    """Rebuild the frame stored under ``prefix`` by :func:`_encode_frame`."""
+    columns = {}
+    for name, kind in schema.items():
+        key = f"{prefix}{name}"
+        if kind == "numeric":
+            columns[name] = bundle[f"{key}.values"]
+            continue
+        if kind == "masked":
+            values = bundle[f"{key}.values"]
+            array = _MASKED_ARRAYS[values.dtype.kind](values, bundle[f"{key}.nulls"])
+            columns[name] = pd.Series(array)
+            continue
+        if kind == "category":
+            categories = decode_strings(bundle[f"{key}.offsets"], bundle[f"{key}.data"])
+            columns[name] = pd.Categorical.from_codes(
+                bundle[f"{key}.codes"], categories
+            )
+            continue
+        values = decode_strings(bundle[f"{key}.offsets"], bundle[f"{key}.data"])
+        if kind == "list":
+            bounds = bundle[f"{key}.list_offsets"].tolist()
+            values = [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        column = pd.Series(values, dtype=object if kind == "list" else None)
+        if f"{key}.nulls" in bundle:
+            column = column.mask(bundle[f"{key}.nulls"])
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+
+def _encode_json(value: dict) -> np.ndarray:
+    return np.frombuffer(json.dumps(value).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_json(array: np.ndarray) -> dict:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def _save_bundle(path: str | Path, arrays: dict[str, np.ndarray]) -> Path:
+    path = Path(path)
+    with open(path, "wb") as handle:
+        np.savez(handle, **arrays)
+    return path
@@ -2,24 +2,273 @@
 
 from __future__ import annotations
 
+import gzip
+import hashlib
 import logging
+import io
+import queue
+import tempfile
+import threading
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from . import instrumentation
+from .columnar import read_columnar, read_tables, write_columnar, write_tables
 
 logger = logging.getLogger(__name__)
 
+OUTPUT_FORMATS = ("csv", "npz")
+
+TITLE_BASICS = "title.basics.tsv"
+TITLE_CREW = "title.crew.tsv"
+TITLE_RATINGS = "title.ratings.tsv"
+NAME_BASICS = "name.basics.tsv"
+TITLE_PRINCIPALS = "title.principals.tsv"
+DUMPS = (TITLE_BASICS, TITLE_CREW, TITLE_RATINGS, NAME_BASICS, TITLE_PRINCIPALS)
+
+# Per-credit columns remembered between incremental runs.
+STATE_ROW_COLUMNS = ["tconst", "directors", "director", "nconst", "actors"]
+
+# Columns holding IMDb ids such as "tt0468569", which are joined as integers.
+ID_COLUMNS = ("tconst", "nconst", "directors")
+ID_DTYPE = np.int32
+# Longest id number parsed; IMDb ids currently have seven or eight digits.
+ID_DIGITS = 9
+# Stands for "\N", a missing id.
+MISSING_ID = -1
+# Low-cardinality text columns kept as pandas categoricals.
+CATEGORY_COLUMNS = ("titleType", "genres", "category")
+
+# Block size used to hash the dumps for incremental updates.
+HASH_BLOCK_BYTES = 2**20
+# Size of the byte ranges parsed by each worker process.
+PARALLEL_BLOCK_BYTES = 64 * 2**20
+# Decompressed blocks of a ``.gz`` dump are read this far ahead of the parser.
+DECOMPRESS_BLOCK_BYTES = 4 * 2**20
+DECOMPRESS_QUEUE_BLOCKS = 4
+
+
+def parse_ids(values: pd.Series) -> np.ndarray:
+    """Return the number of every IMDb id in ``values``.
+
+    ``"tt0468569"`` becomes ``468569``. Of a comma-separated list such as the
+    directors of a movie only the first id is kept, and missing ids become
+    :data:`MISSING_ID`.
+    """
+    # Digits are read column by column from fixed-width bytes, which is much
+    # cheaper than pandas string methods on millions of rows.
+    raw = np.asarray(values, dtype=f"S{ID_DIGITS + 2}")
+    codes = raw.view(np.uint8).reshape(len(raw), raw.itemsize)[:, 2:]
+    is_digit = np.logical_and.accumulate((codes >= 48) & (codes <= 57), axis=1)
+    numbers = np.zeros(len(raw), dtype=np.int64)
+    for column in range(codes.shape[1]):
+        digit = codes[:, column].astype(np.int64) - 48
+        numbers = np.where(is_digit[:, column], numbers * 10 + digit, numbers)
+    numbers[~is_digit[:, 0]] = MISSING_ID
+    return numbers.astype(ID_DTYPE)
+
+
+def format_ids(ids: pd.Series | np.ndarray, prefix: str) -> pd.Series:
+    """Inverse of :func:`parse_ids`, padding numbers to seven digits like IMDb."""
+    return prefix + pd.Series(ids).astype(str).str.zfill(7)
+
+
+def _prepare_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Parse the id columns of ``chunk`` and make its text codes categorical."""
+    for column in chunk.columns.intersection(ID_COLUMNS):
+        chunk[column] = parse_ids(chunk[column])
+    for column in chunk.columns.intersection(CATEGORY_COLUMNS):
+        chunk[column] = chunk[column].astype("category")
+    return chunk
+
+
+def _row_mask(
+    chunk: pd.DataFrame,
+    equals: dict[str, str] | None,
+    isin: dict[str, Iterable[str]] | None,
+) -> np.ndarray:
+    """Return which rows of ``chunk`` match every filter."""
+    mask = np.ones(len(chunk), dtype=bool)
+    for column, value in (equals or {}).items():
+        mask &= (chunk[column] == value).to_numpy()
+    for column, keys in (isin or {}).items():
+        mask &= chunk[column].isin(keys).to_numpy()
+    return mask
+
+
+class _GzipStream(io.RawIOBase):
+    """Decompress a gzip file in a background thread while it is being read.
+
+    zlib releases the GIL, and so does the pandas tokenizer, so inflating the
+    next blocks overlaps with parsing the current one. At most
+    ``DECOMPRESS_QUEUE_BLOCKS`` blocks are held in memory.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._blocks = queue.Queue(DECOMPRESS_QUEUE_BLOCKS)
+        self._pending = memoryview(b"")
+        self._finished = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._decompress, args=(path,), daemon=True
+        )
+        self._thread.start()
+
+    def _decompress(self, path: Path) -> None:
+        try:
+            with gzip.open(path, "rb") as handle:
+                while True:
+                    block = handle.read(DECOMPRESS_BLOCK_BYTES)
+                    if not self._put(block) or not block:
+                        return
+        except Exception as exc:
+            self._put(exc)
+
+    def _put(self, item: bytes | Exception) -> bool:
+        """Queue ``item`` unless the reader was closed in the meantime."""
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            if self._finished:
+                return 0
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._finished = True
+                return 0
+            self._pending = memoryview(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        super().close()
+
+
+def _open_dump(path: Path) -> io.BufferedIOBase:
+    """Open ``path`` for reading, decompressing ``.gz`` files on the fly."""
+    if path.suffix == ".gz":
+        return io.BufferedReader(_GzipStream(path), DECOMPRESS_BLOCK_BYTES)
+    return open(path, "rb")
+
+
+def _byte_ranges(path: Path) -> list[tuple[int, int]]:
+    """Split ``path`` after its header into line-aligned byte ranges."""
+    size = path.stat().st_size
+    ranges = []
+    with open(path, "rb") as handle:
+        start = len(handle.readline())
+        while start < size:
+            handle.seek(min(start + PARALLEL_BLOCK_BYTES, size))
+            handle.readline()
+            end = min(handle.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(
+    path: Path,
+    start: int,
+    end: int,
+    header: list[str],
+    usecols: list[str],
+    equals: dict[str, str] | None,
+    isin: dict[str, Iterable[str]] | None,
+    output: Path,
+) -> Path:
+    """Parse and filter one byte range of a dump in a worker process."""
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    chunk = pd.read_csv(
+        io.BytesIO(data),
+        low_memory=False,
+        sep="\t",
+        encoding="utf-8",
+        header=None,
+        names=header,
+        usecols=usecols,
+        dtype={column: "category" for column in CATEGORY_COLUMNS},
+    )
+    chunk = _prepare_chunk(chunk)
+    return write_columnar(output, chunk.loc[_row_mask(chunk, equals, isin)])
+
 
 class MovieDatasetReducer:
-    """Reduce raw IMDb TSV dumps to a smaller CSV dataset."""
+    """Reduce raw IMDb TSV dumps to a smaller CSV dataset.
+
+    The dumps are streamed ``chunksize`` rows at a time and every chunk is
+    filtered before it is kept, so memory use depends on the size of the
+    reduced dataset rather than on the size of the dumps. With ``workers``
+    greater than one each dump is parsed by a pool of processes.
+
+    Dumps are looked up in ``input_dir``, either uncompressed or gzipped as
+    published by IMDb (``title.basics.tsv.gz``). Gzipped dumps are
+    decompressed while they are parsed, without a copy on disk. They cannot
+    be split into byte ranges, so they are parsed in a single process.
+
+    ``output_format`` is ``"csv"`` or ``"npz"``. The ``.npz`` bundle keeps
+    scores as floats and actors and genres as real lists, and is read by
+    :meth:`MovieRecommender.load_dataset` without any text parsing.
+    """
+
+    def __init__(
+        self,
+        chunksize: int = 1000000,
+        output_format: str = "csv",
+        workers: int = 1,
+        input_dir: str | Path = ".",
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unknown output format {output_format!r}. "
+                f"Choose one of {', '.join(OUTPUT_FORMATS)}."
+            )
+        self.chunksize = chunksize
+        self.output_format = output_format
+        self.workers = workers
+        self.input_dir = Path(input_dir)
 
     @staticmethod
     def weighted_rating(row: pd.Series, C: float, m: float) -> float:
-        """Compute IMDb weighted rating for a single row."""
-        v = row["numVotes"]
-        R = row["averageRating"]
-        return (v / (v + m) * R) + (m / (m + v) * C)
+        """Compute IMDb weighted rating for a single row.
+
+        Kept for compatibility; :meth:`weighted_ratings` scores whole columns.
+        """
+        return float(
+            MovieDatasetReducer.weighted_ratings(
+                row["numVotes"], row["averageRating"], C, m
+            )
+        )
+
+    @staticmethod
+    def weighted_ratings(
+        votes: pd.Series | np.ndarray,
+        ratings: pd.Series | np.ndarray,
+        C: float,
+        m: float,
+    ) -> pd.Series | np.ndarray:
+        """Compute the IMDb weighted rating of whole vote and rating columns."""
+        return (votes / (votes + m) * ratings) + (m / (m + votes) * C)
 
     def reduce_dataset(
         self, percentage: float, output_name: str | Path
@@ -32,98 +281,478 @@ class MovieDatasetReducer:
             Quantile of vote counts to retain. ``0.90`` keeps roughly the top
             10%% of movies by vote count.
         output_name:
-            Path prefix for the CSV file that will be written.
+            Path prefix for the file that will be written.
         """
+        return self.reduce_datasets([percentage], [output_name])[0]
+
+    def reduce_datasets(
+        self, percentages: Sequence[float], output_names: Sequence[str | Path]
+    ) -> list[pd.DataFrame]:
+        """Reduce the raw IMDb dump to several vote quantiles in one pass.
+
+        The dumps are read and joined once for the loosest quantile; every
+        entry of ``percentages`` is then scored and written to the matching
+        entry of ``output_names``.
+        """
+        if len(percentages) != len(output_names):
+            raise ValueError("Pass one output name per percentage.")
         logger.info("Getting movie dataset...")
-        title = pd.read_csv(
-            "title.basics.tsv",
-            low_memory=False,
-            chunksize=1000000,
-            sep="\t",
-            encoding="utf-8",
-            usecols=["tconst", "titleType", "primaryTitle", "genres"],
-        )
-        director = pd.read_csv(
-            "title.crew.tsv",
-            low_memory=False,
-            chunksize=1000000,
-            sep="\t",
-            encoding="utf-8",
-            usecols=["tconst", "directors"],
-        )
-        ratings = pd.read_csv("title.ratings.tsv", sep="\t", encoding="utf-8")
-
-        metadata = pd.concat(title)
-        director = pd.concat(director)
-        metadata = metadata.loc[metadata["titleType"] == "movie"]
-
-        metadata = metadata.merge(ratings, on="tconst")
-        metadata = metadata.merge(director, on="tconst")
-        title, ratings, director = None, None, None
-
-        metadata["directors"] = metadata["directors"].apply(lambda x: x[:9])
+        candidates = self._rate(self._read_movies())
+        C = candidates["averageRating"].mean()
+        thresholds = [candidates["numVotes"].quantile(p) for p in percentages]
+        candidates = candidates.loc[candidates["numVotes"] >= min(thresholds)]
+
+        logger.info("Getting movie cast members...")
+        cast = self._read_cast(candidates["tconst"])
+        metadata = self._attach_names(candidates, cast)
+
+        return [
+            self._write_quantile(metadata, C, m, percentage, output_name)
+            for percentage, m, output_name in zip(percentages, thresholds, output_names)
+        ]
+
+    def update_dataset(
+        self, percentage: float, output_name: str | Path, state_path: str | Path
+    ) -> pd.DataFrame:
+        """Refresh a reduced dataset from new dumps, reusing previous work.
+
+        ``state_path`` stores the movies of the previous run and the cast and
+        resolved names of every kept movie, plus the size, modification time
+        and SHA-256 hash of each dump. On the next call only dumps whose
+        content changed are read again, and ``C``, ``m`` and every score are
+        re-derived from the new ratings. Only movies whose director or cast
+        changed, that newly pass the vote quantile or that credit a renamed
+        person are joined with ``name.basics.tsv`` again, so the output
+        matches :meth:`reduce_dataset`.
+        """
+        state_path = Path(state_path)
+        tables, previous = self._read_state(state_path)
+        previous = previous.get("fingerprint", {})
+        fingerprint = self._dump_fingerprint(previous)
+        changed = [
+            name
+            for name, stamp in fingerprint.items()
+            if not isinstance(previous.get(name), list)
+            or previous[name][-1] != stamp[-1]
+        ]
+        logger.info("Changed dumps: %s", ", ".join(changed) or "none")
+
+        # States written before movies carried a year are refreshed as well.
+        if (
+            TITLE_BASICS in changed
+            or TITLE_CREW in changed
+            or "year" not in tables.get("movies", ())
+        ):
+            logger.info("Getting movie dataset...")
+            movies = self._read_movies()
+        else:
+            movies = tables["movies"]
+        candidates = self._rate(movies)
+        C = candidates["averageRating"].mean()
+        m = candidates["numVotes"].quantile(percentage)
+        candidates = candidates.loc[candidates["numVotes"] >= m]
+
+        rows = tables["rows"]
+        known = rows.drop_duplicates("tconst").set_index("tconst")["directors"]
+        known = known.reindex(candidates["tconst"])
+        is_new = known.isna().to_numpy()
+        logger.info("Getting movie cast members...")
+        if TITLE_PRINCIPALS in changed:
+            cast = self._read_cast(candidates["tconst"])
+        else:
+            cast = rows.loc[
+                rows["tconst"].isin(candidates["tconst"]) & rows["nconst"].notna(),
+                ["tconst", "nconst"],
+            ].astype(ID_DTYPE)
+            if is_new.any():
+                cast = pd.concat(
+                    [cast, self._read_cast(candidates.loc[is_new, "tconst"])],
+                    ignore_index=True,
+                )
+
+        dirty = (
+            is_new
+            | (known.to_numpy() != candidates["directors"].to_numpy())
+            | (
+                self._cast_signature(cast, candidates["tconst"])
+                != self._cast_signature(rows, candidates["tconst"])
+            )
+        )
+        names = None
+        if NAME_BASICS in changed:
+            # Names are read once for every credited person; kept movies are
+            # only joined again when they credit someone who was renamed.
+            names = self._read_names(candidates["directors"], cast["nconst"])
+            renamed = self._renamed_people(rows, names)
+            credited = cast.loc[cast["nconst"].isin(renamed), "tconst"]
+            dirty |= (
+                candidates["directors"].isin(renamed)
+                | candidates["tconst"].isin(credited)
+            ).to_numpy()
+        logger.info("Updating %s of %s movies.", int(dirty.sum()), len(candidates))
+        changed_tconsts = candidates.loc[dirty, "tconst"]
+        fresh = self._attach_names(
+            candidates.loc[dirty],
+            cast.loc[cast["tconst"].isin(changed_tconsts)],
+            names,
+        )
+        kept_rows = rows.loc[
+            rows["tconst"].isin(candidates["tconst"])
+            & ~rows["tconst"].isin(changed_tconsts)
+        ]
+        metadata = candidates.merge(
+            pd.concat([kept_rows, fresh[STATE_ROW_COLUMNS]], ignore_index=True).drop(
+                columns="directors"
+            ),
+            how="left",
+            on="tconst",
+        )
+
+        write_tables(
+            state_path,
+            {"movies": movies, "rows": metadata[STATE_ROW_COLUMNS]},
+            {"fingerprint": fingerprint},
+        )
+        return self._write_quantile(metadata, C, m, percentage, output_name)
+
+    def _read_movies(self) -> pd.DataFrame:
+        """Return every movie with its title, year, genres and first director id.
+
+        ``parse_ids`` keeps the first id of the ``directors`` list.
+        """
+        metadata = self._read_filtered(
+            TITLE_BASICS,
+            ["tconst", "titleType", "primaryTitle", "startYear", "genres"],
+            equals={"titleType": "movie"},
+        )
+        del metadata["titleType"]
+        metadata.rename(
+            columns={"primaryTitle": "title", "startYear": "year"}, inplace=True
+        )
+        metadata["year"] = pd.to_numeric(metadata["year"], errors="coerce").astype(
+            "Int64"
+        )
 
+        movies = metadata["tconst"]
+        director = self._read_filtered(
+            TITLE_CREW,
+            ["tconst", "directors"],
+            isin={"tconst": movies},
+        )
+        with instrumentation.stage("merge:crew", len(metadata)) as record:
+            metadata = metadata.merge(director, on="tconst")
+            record.rows_out = len(metadata)
+        return metadata
+
+    def _rate(self, movies: pd.DataFrame) -> pd.DataFrame:
+        """Join ``movies`` with the vote counts and average ratings."""
+        with instrumentation.stage(f"read:{TITLE_RATINGS}") as record:
+            with _open_dump(self._dump_path(TITLE_RATINGS)) as source:
+                ratings = pd.read_csv(source, sep="\t", encoding="utf-8")
+            ratings = _prepare_chunk(ratings)
+            record.rows_out = len(ratings)
+        with instrumentation.stage("merge:ratings", len(movies)) as record:
+            rated = movies.merge(ratings, on="tconst")
+            record.rows_out = len(rated)
+        return rated
+
+    def _read_cast(self, tconsts: pd.Series) -> pd.DataFrame:
+        """Return the ``(tconst, nconst)`` actor credits of ``tconsts``."""
+        cast = self._read_filtered(
+            TITLE_PRINCIPALS,
+            ["tconst", "nconst", "category"],
+            equals={"category": "actor"},
+            isin={"tconst": tconsts},
+        )
+        del cast["category"]
+        return cast
+
+    def _attach_names(
+        self,
+        movies: pd.DataFrame,
+        cast: pd.DataFrame,
+        names: pd.DataFrame | None = None,
+    ) -> pd.DataFrame:
+        """Return one row per movie and actor with director and actor names.
+
+        ``names`` may hold the ``(nconst, primaryName)`` pairs read already;
+        otherwise the names of the credited people are read.
+        """
+        if names is None:
+            names = self._read_names(movies["directors"], cast["nconst"])
+        with instrumentation.stage("merge:names", len(movies)) as record:
+            credits = cast.merge(
+                names.rename(columns={"primaryName": "actors"}), how="left", on="nconst"
+            )
+            metadata = movies.merge(
+                names.rename(
+                    columns={"nconst": "directors", "primaryName": "director"}
+                ),
+                how="left",
+                on="directors",
+            )
+            metadata = metadata.merge(credits, how="left", on="tconst")
+            # Movies without actors leave a gap in the otherwise integer ids.
+            metadata["nconst"] = metadata["nconst"].astype("Int32")
+            record.rows_out = len(metadata)
+        return metadata
+
+    def _write_quantile(
+        self,
+        metadata: pd.DataFrame,
+        C: float,
+        m: float,
+        percentage: float,
+        output_name: str | Path,
+    ) -> pd.DataFrame:
+        """Score the movies with at least ``m`` votes and write them."""
         logger.info(
             "Reducing data to %s%% of most popular movies.",
             round((1 - percentage) * 100),
         )
-        C = metadata["averageRating"].mean()
-        m = metadata["numVotes"].quantile(percentage)
-        metadata = metadata.loc[metadata["numVotes"] >= m]
-        metadata["score"] = metadata.apply(self.weighted_rating, C=C, m=m, axis=1)
+        with instrumentation.stage("score", len(metadata)) as record:
+            subset = metadata.loc[metadata["numVotes"] >= m]
+            scores = self.weighted_ratings(
+                subset["numVotes"], subset["averageRating"], C, m
+            )
+            subset = subset[
+                ["tconst", "title", "year", "director", "genres", "actors"]
+            ].assign(score=scores)
+            record.rows_out = len(subset)
+        return self._write_dataset(subset, output_name)
 
+    def _read_names(self, directors: pd.Series, actors: pd.Series) -> pd.DataFrame:
+        """Return the ``(nconst, primaryName)`` pairs of the given people."""
         logger.info("Getting movie directors...")
-        names = pd.read_csv(
-            "name.basics.tsv",
-            low_memory=False,
-            chunksize=1000000,
-            sep="\t",
-            encoding="utf-8",
-            usecols=["nconst", "primaryName"],
-        )
-        names = pd.concat(names)
-        metadata = metadata.merge(
-            names, how="left", left_on="directors", right_on="nconst"
+        people = pd.concat([directors, actors]).unique()
+        people = people[people != MISSING_ID]
+        if not len(people):
+            return self._combine([], ["nconst", "primaryName"])
+        return self._read_filtered(
+            NAME_BASICS,
+            ["nconst", "primaryName"],
+            isin={"nconst": people},
         )
 
-        series = ["directors", "nconst", "averageRating", "numVotes"]
-        for column in series:
-            del metadata[column]
+    @staticmethod
+    def _renamed_people(rows: pd.DataFrame, names: pd.DataFrame) -> np.ndarray:
+        """Return the ids in ``rows`` whose name differs from the one in ``names``.
 
-        metadata.rename(columns={"primaryName": "director"}, inplace=True)
+        ``rows`` holds the names resolved by the previous run; a person who
+        gained or lost a name counts as renamed too.
+        """
+        credits = rows.loc[rows["nconst"].notna()]
+        stored = pd.concat(
+            [
+                pd.Series(rows["director"].to_numpy(), rows["directors"].to_numpy()),
+                pd.Series(
+                    credits["actors"].to_numpy(),
+                    credits["nconst"].to_numpy(dtype=ID_DTYPE),
+                ),
+            ]
+        )
+        stored = stored[~stored.index.duplicated()]
+        current = names.drop_duplicates("nconst").set_index("nconst")["primaryName"]
+        current = current.reindex(stored.index)
+        differs = current.to_numpy(dtype=object) != stored.to_numpy(dtype=object)
+        differs &= ~(current.isna().to_numpy() & stored.isna().to_numpy())
+        return stored.index[differs].to_numpy()
 
-        logger.info("Getting movie cast members...")
-        cast = pd.read_csv(
-            "title.principals.tsv",
-            low_memory=False,
-            chunksize=1000000,
-            sep="\t",
-            encoding="utf-8",
-            usecols=["tconst", "nconst", "category"],
+    @staticmethod
+    def _cast_signature(cast: pd.DataFrame, tconsts: pd.Series) -> np.ndarray:
+        """Return the ordered actor ids of each of ``tconsts`` as one string."""
+        credits = cast.loc[cast["nconst"].notna()]
+        signature = (
+            credits["nconst"]
+            .astype(str)
+            .groupby(credits["tconst"], sort=False)
+            .agg(",".join)
         )
-        cast = pd.concat(cast)
-        cast = cast.loc[cast["category"] == "actor"]
-        metadata = metadata.merge(cast, how="left", on="tconst")
-        metadata = metadata.merge(names, how="left", on="nconst")
-        cast, names = None, None
+        return signature.reindex(tconsts, fill_value="").to_numpy()
 
-        metadata.rename(columns={"primaryName": "actors"}, inplace=True)
-        metadata.rename(columns={"primaryTitle": "title"}, inplace=True)
+    def _dump_fingerprint(self, previous: dict[str, list]) -> dict[str, list]:
+        """Return the size, modification time and SHA-256 hex digest of every dump.
 
-        metadata = (
-            metadata.astype(str)
-            .groupby(["title", "director", "genres", "score"])["actors"]
-            .apply(list)
-            .reset_index()
-        )
+        A dump whose size and modification time match ``previous`` keeps its
+        digest there; the others are hashed, so that a freshly downloaded but
+        identical dump does not count as changed.
+        """
+        fingerprint = {}
+        for name in DUMPS:
+            path = self._dump_path(name)
+            stat = path.stat()
+            stamp = [stat.st_size, stat.st_mtime_ns]
+            known = previous.get(name)
+            if isinstance(known, list) and len(known) == 3 and known[:2] == stamp:
+                fingerprint[name] = known
+                continue
+            digest = hashlib.sha256()
+            with instrumentation.stage(f"hash:{name}"):
+                with open(path, "rb") as handle:
+                    while block := handle.read(HASH_BLOCK_BYTES):
+                        digest.update(block)
+            fingerprint[name] = [*stamp, digest.hexdigest()]
+        return fingerprint
 
-        metadata["genres"] = (
-            metadata["genres"].astype(str).apply(lambda x: x.split(","))
+    def _dump_path(self, name: str) -> Path:
+        """Return the path of dump ``name``, preferring an uncompressed file."""
+        path = self.input_dir / name
+        compressed = path.with_name(f"{name}.gz")
+        if not path.exists() and compressed.exists():
+            return compressed
+        return path
+
+    @staticmethod
+    def _read_state(state_path: Path) -> tuple[dict[str, pd.DataFrame], dict]:
+        """Return the tables and metadata of a previous :meth:`update_dataset`."""
+        if state_path.exists():
+            tables, metadata = read_tables(state_path)
+            if pd.api.types.is_integer_dtype(tables["rows"]["tconst"]):
+                return tables, metadata
+            logger.info("Reducer state at %s has text ids, reducing again.", state_path)
+        else:
+            logger.info("No reducer state at %s, reducing from scratch.", state_path)
+        empty_rows = pd.DataFrame(
+            {
+                "tconst": pd.Series(dtype=ID_DTYPE),
+                "directors": pd.Series(dtype=ID_DTYPE),
+                "director": pd.Series(dtype=object),
+                "nconst": pd.Series(dtype="Int32"),
+                "actors": pd.Series(dtype=object),
+            }
         )
+        return {"rows": empty_rows}, {}
+
+    def _read_filtered(
+        self,
+        filename: str,
+        usecols: list[str],
+        equals: dict[str, str] | None = None,
+        isin: dict[str, Iterable[str]] | None = None,
+    ) -> pd.DataFrame:
+        """Stream ``filename`` and keep only the matching rows.
+
+        A row is kept when every column in ``equals`` has the given value and
+        every column in ``isin`` holds one of the given keys. With several
+        ``workers`` an uncompressed file is split into byte ranges that are
+        parsed and filtered concurrently.
+        """
+        path = self._dump_path(filename)
+        with instrumentation.stage(f"read:{filename}") as record:
+            if self.workers > 1 and path.suffix != ".gz":
+                result = self._read_filtered_parallel(path, usecols, equals, isin)
+            else:
+                record.rows_in = 0
+                kept = []
+                with _open_dump(path) as source:
+                    chunks = pd.read_csv(
+                        source,
+                        low_memory=False,
+                        chunksize=self.chunksize,
+                        sep="\t",
+                        encoding="utf-8",
+                        usecols=usecols,
+                        dtype={column: "category" for column in CATEGORY_COLUMNS},
+                    )
+                    for chunk in chunks:
+                        record.rows_in += len(chunk)
+                        chunk = _prepare_chunk(chunk)
+                        kept.append(chunk.loc[_row_mask(chunk, equals, isin)])
+                result = self._combine(kept, usecols)
+            record.rows_out = len(result)
+        return result
+
+    def _read_filtered_parallel(
+        self,
+        path: Path,
+        usecols: list[str],
+        equals: dict[str, str] | None,
+        isin: dict[str, Iterable[str]] | None,
+    ) -> pd.DataFrame:
+        """Parse byte ranges of ``path`` in a process pool.
+
+        Workers hand their filtered rows back as ``.npz`` files in a temporary
+        directory, which keeps the results compact and avoids pickling large
+        frames through the pool.
+        """
+        with open(path, "rb") as handle:
+            header = handle.readline().decode("utf-8").rstrip("\r\n").split("\t")
+        isin = {
+            column: pd.unique(np.asarray(keys)) for column, keys in (isin or {}).items()
+        }
+        with tempfile.TemporaryDirectory(prefix="reducer-") as tmpdir:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [
+                    pool.submit(
+                        _read_range,
+                        path,
+                        start,
+                        end,
+                        header,
+                        usecols,
+                        equals,
+                        isin,
+                        Path(tmpdir) / f"part-{number:05d}.npz",
+                    )
+                    for number, (start, end) in enumerate(_byte_ranges(path))
+                ]
+                parts = [read_columnar(future.result()) for future in futures]
+        return self._combine(parts, usecols)
+
+    @staticmethod
+    def _combine(parts: list[pd.DataFrame], usecols: list[str]) -> pd.DataFrame:
+        """Concatenate filtered chunks, keeping integer ids and categoricals.
+
+        Chunks have their own categories, so categorical columns are rebuilt
+        once all of them are joined.
+        """
+        if not parts:
+            return _prepare_chunk(pd.DataFrame(columns=usecols, dtype=object))
+        result = pd.concat(parts, ignore_index=True)
+        for column in result.columns.intersection(CATEGORY_COLUMNS):
+            result[column] = result[column].astype("category")
+        return result
+
+    def _write_dataset(
+        self, metadata: pd.DataFrame, output_name: str | Path
+    ) -> pd.DataFrame:
+        """Group actors per movie and write the ``output_name`` file.
+
+        ``metadata`` holds one row per movie and actor, movies in any order.
+        Rows are grouped by sorting the integer movie codes once, and every
+        distinct genre string is split only once. Movies whose director is
+        unknown are kept with the director ``"nan"``, as the text conversion
+        of earlier versions wrote it.
+        """
+        with instrumentation.stage("group", len(metadata)) as record:
+            first = ~metadata["tconst"].duplicated().to_numpy()
+            codes = pd.factorize(metadata["tconst"])[0]
+            named = metadata["actors"].notna().to_numpy()
+            order = np.argsort(codes[named], kind="stable")
+            actors = metadata["actors"].to_numpy()[named][order]
+            counts = np.bincount(codes[named], minlength=int(first.sum()))
+            groups = np.split(actors, np.cumsum(counts)[:-1])
 
-        metadata = metadata.sort_values("score", ascending=False)
+            movies = metadata.loc[
+                first, ["tconst", "title", "year", "director", "genres", "score"]
+            ].reset_index(drop=True)
+            movies["tconst"] = format_ids(movies["tconst"].to_numpy(), "tt")
+            movies["director"] = movies["director"].astype(object).fillna("nan")
+            genres = movies["genres"].astype("category")
+            split = [value.split(",") for value in genres.cat.categories]
+            movies["genres"] = [
+                list(split[code]) if code >= 0 else [] for code in genres.cat.codes
+            ]
+            movies["actors"] = [group.tolist() for group in groups]
+            movies["score"] = movies["score"].astype(float)
+            metadata = movies.sort_values("score", ascending=False, kind="stable")
+            record.rows_out = len(metadata)
 
-        output_path = Path(f"{output_name}.csv")
-        metadata.to_csv(output_path)
+        output_path = Path(f"{output_name}.{self.output_format}")
+        with instrumentation.stage(f"write:{self.output_format}", len(metadata)):
+            if self.output_format == "npz":
+                write_columnar(output_path, metadata.reset_index(drop=True))
+            else:
+                metadata.to_csv(output_path)
         logger.info("Saved dataset to %s", output_path)
         return metadata
@@ -0,0 +1,217 @@
+"""Lightweight stage timings, memory use and latency histograms.
+
+Recording is off by default. Call :func:`enable` (or set the
+``MOVIES_METRICS`` environment variable) to log every stage as one JSON line
+and to aggregate the numbers rendered by :func:`render_prometheus`. While
+disabled, :func:`stage` returns a shared no-op object and
+:func:`observe_latency` returns at once.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows: the peak RSS is not reported.
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _current_rss() -> int | None:
+    """Return the resident set size in bytes, where ``/proc`` provides it."""
+    try:
+        with open("/proc/self/statm", "rb") as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _peak_rss() -> int | None:
+    """Return the peak resident set size of the process in bytes, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage:
+    """Timing of one stage; set ``rows_in`` and ``rows_out`` while it runs."""
+
+    __slots__ = ("metrics", "name", "rows_in", "rows_out", "_start", "_rss", "_peak")
+
+    def __init__(self, metrics: Metrics | None, name: str, rows_in: int | None):
+        self.metrics = metrics
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self) -> Stage:
+        if self.metrics is not None:
+            self._rss = _current_rss()
+            self._peak = _peak_rss()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if self.metrics is not None:
+            seconds = time.perf_counter() - self._start
+            self.metrics._finish(self, seconds, exc_type is None)
+
+
+class Metrics:
+    """Thread-safe aggregate of stage records and latency histograms."""
+
+    def __init__(self) -> None:
+        self.enabled = bool(os.environ.get("MOVIES_METRICS"))
+        self._lock = threading.Lock()
+        self._null_stage = Stage(None, "", None)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._stages = defaultdict(lambda: defaultdict(float))
+            self._histograms = {}
+
+    def stage(self, name: str, rows_in: int | None = None) -> Stage:
+        """Return a context manager that records the stage ``name``."""
+        if not self.enabled:
+            return self._null_stage
+        return Stage(self, name, rows_in)
+
+    def observe_latency(self, name: str, seconds: float, **labels: str) -> None:
+        """Add ``seconds`` to the ``name`` histogram with ``labels``."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][position] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def _finish(self, stage: Stage, seconds: float, succeeded: bool) -> None:
+        rss = _current_rss()
+        peak = _peak_rss()
+        record = {
+            "event": "stage",
+            "stage": stage.name,
+            "seconds": round(seconds, 6),
+            "rows_in": stage.rows_in,
+            "rows_out": stage.rows_out,
+            "rss_delta_bytes": (
+                None if rss is None or stage._rss is None else rss - stage._rss
+            ),
+            # The process peak is only raised by a stage that needs more
+            # memory than any earlier one, so its growth is attributed to it.
+            "peak_rss_growth_bytes": (
+                None if peak is None or stage._peak is None else peak - stage._peak
+            ),
+            "ok": succeeded,
+        }
+        logger.info(json.dumps(record))
+        with self._lock:
+            totals = self._stages[stage.name]
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["rows_in"] += stage.rows_in or 0
+            totals["rows_out"] += stage.rows_out or 0
+            totals["errors"] += not succeeded
+            if record["peak_rss_growth_bytes"] is not None:
+                totals["peak_rss_growth_bytes"] = record["peak_rss_growth_bytes"]
+
+    def render_prometheus(self) -> str:
+        """Return everything recorded in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._stages.items()}
+            histograms = {
+                key: {**value, "buckets": list(value["buckets"])}
+                for key, value in self._histograms.items()
+            }
+        for metric, field, kind, description in (
+            ("movies_stage_calls_total", "calls", "counter", "Stage runs."),
+            ("movies_stage_errors_total", "errors", "counter", "Failed stage runs."),
+            ("movies_stage_seconds_total", "seconds", "counter", "Stage wall time."),
+            ("movies_stage_rows_in_total", "rows_in", "counter", "Rows read."),
+            ("movies_stage_rows_out_total", "rows_out", "counter", "Rows produced."),
+            (
+                "movies_stage_peak_rss_growth_bytes",
+                "peak_rss_growth_bytes",
+                "gauge",
+                "Growth of the process peak RSS during the last run of the stage.",
+            ),
+        ):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, totals in sorted(stages.items()):
+                if field not in totals:
+                    continue
+                lines.append(f'{metric}{{stage="{_escape(name)}"}} {totals[field]:g}')
+        for name in sorted({name for name, _ in histograms}):
+            metric = f"movies_{name}_seconds"
+            lines.append(f"# HELP {metric} Latency of {name} calls.")
+            lines.append(f"# TYPE {metric} histogram")
+            for (key, labels), histogram in sorted(histograms.items()):
+                if key != name:
+                    continue
+                label_text = "".join(f'{k}="{_escape(v)}",' for k, v in labels)
+                for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    lines.append(
+                        f'{metric}_bucket{{{label_text}le="{bound:g}"}} {count}'
+                    )
+                count = histogram["count"]
+                lines.append(f'{metric}_bucket{{{label_text}le="+Inf"}} {count}')
+                label_text = label_text.rstrip(",")
+                lines.append(f"{metric}_sum{{{label_text}}} {histogram['sum']:g}")
+                lines.append(f"{metric}_count{{{label_text}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+def enable(enabled: bool = True) -> None:
+    """Turn recording on or off for the whole process."""
+    METRICS.enabled = enabled
+
+
+def stage(name: str, rows_in: int | None = None) -> Stage:
+    """Record the stage ``name`` in the process-wide :data:`METRICS`."""
+    return METRICS.stage(name, rows_in)
+
+
+def observe_latency(name: str, seconds: float, **labels: str) -> None:
+    """Add one latency to a histogram of the process-wide :data:`METRICS`."""
+    METRICS.observe_latency(name, seconds, **labels)
+
+
+def render_prometheus() -> str:
+    """Render the process-wide :data:`METRICS` in the Prometheus text format."""
+    return METRICS.render_prometheus()
@@ -2,19 +2,148 @@
 
 from __future__ import annotations
 
-import pandas as pd
+import contextlib
+import hashlib
+import itertools
+import json
+import shutil
+import tempfile
+import time
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds are not serialized.
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from . import instrumentation
+from .ann_index import MinHashLSHIndex, approximate_top_k
+from .columnar import decode_strings, encode_strings, read_columnar
+from .neighbors import NeighborTable, replace_directory, top_k_indices
+from .result_cache import ResultCache
+from .title_index import TitleIndex
+
+
+SIMILARITY_MODES = ("dense", "topk", "query", "ann")
+
+# Columns read from a reduced dataset; ``tconst`` and ``year`` are optional.
+DATASET_COLUMNS = ["tconst", "title", "year", "director", "genres", "score", "actors"]
+
+# Bump whenever the layout written by ``MovieRecommender.save_model`` changes.
+MODEL_FORMAT_VERSION = 2
+
+# Similarity scores held at once while ranking a batch of titles.
+BATCH_BLOCK_BYTES = 64 * 2**20
+
+
+def dataset_fingerprint(dataset: str | Path) -> str:
+    """Return the SHA-256 hex digest of the ``dataset`` file contents."""
+    digest = hashlib.sha256()
+    with open(dataset, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_model_metadata(path: Path) -> dict | None:
+    """Return the metadata of the model saved at ``path`` if there is one."""
+    try:
+        return json.loads((path / "model.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def _model_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` across processes.
+
+    The lock lives in a ``.lock`` file next to the model, so it survives the
+    model directory being replaced.
+    """
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
 
 
 class MovieRecommender:
-    """Load movie data and generate recommendations."""
+    """Load movie data and generate recommendations.
+
+    Parameters
+    ----------
+    similarity:
+        ``"dense"`` keeps the full cosine similarity matrix. ``"topk"`` keeps
+        only the ``top_k`` nearest neighbors of every movie, which needs
+        memory linear in the catalog size. ``"query"`` precomputes nothing
+        pairwise and scores the queried movie against the L2-normalized
+        feature matrix on every call. ``"ann"`` scores only the candidates
+        found by a :class:`MinHashLSHIndex`, for catalogs too large to scan.
+    top_k:
+        Number of neighbors stored per movie in ``"topk"`` mode.
+    block_size:
+        Rows of the similarity matrix computed at once in ``"topk"`` mode.
+        ``None`` picks a size that bounds each block to a few dozen MB.
+    ann_bands, ann_rows, ann_candidates:
+        :class:`MinHashLSHIndex` settings for ``"ann"`` mode. More bands,
+        fewer rows per band and more candidates trade speed for recall.
+    cache_size, cache_ttl:
+        With a positive ``cache_size``, :meth:`recommend` results are kept in
+        a thread-safe :class:`ResultCache` of that many entries, each valid
+        for ``cache_ttl`` seconds (``None`` for no expiry). The cache is
+        emptied whenever a dataset is loaded.
+    """
 
-    def __init__(self):
+    def __init__(
+        self,
+        similarity: str = "dense",
+        top_k: int = 50,
+        block_size: int | None = None,
+        ann_bands: int = 32,
+        ann_rows: int = 2,
+        ann_candidates: int = 200,
+        cache_size: int = 0,
+        cache_ttl: float | None = None,
+    ):
+        if similarity not in SIMILARITY_MODES:
+            raise ValueError(
+                f"Unknown similarity mode {similarity!r}. "
+                f"Choose one of {', '.join(SIMILARITY_MODES)}."
+            )
+        self.similarity = similarity
+        self.top_k = top_k
+        self.block_size = block_size
+        self.ann_options = {
+            "bands": ann_bands,
+            "rows": ann_rows,
+            "max_candidates": ann_candidates,
+        }
         self.df = None
         self.indices = None
+        self._title_index = None
         self.cosine_sim = None
+        self.neighbors = None
+        self.ann_index = None
+        self.features = None
+        self._features_t = None
+        self.vectorizer = None
+        self.dataset_hash = None
+        self.result_cache = (
+            ResultCache(cache_size, cache_ttl) if cache_size > 0 else None
+        )
 
     @staticmethod
     def clean_data(value: list[str] | str | None) -> list[str] | str:
@@ -32,35 +161,784 @@ class MovieRecommender:
             ["".join(row["actors"]), "".join(row["director"]), "".join(row["genres"])]
         )
 
-    def load_dataset(self, dataset: str | Path) -> pd.DataFrame:
-        """Read the reduced CSV dataset and prepare similarity matrix."""
-        df = pd.read_csv(
-            dataset,
-            sep=",",
-            encoding="utf-8",
-            usecols=["title", "director", "genres", "score", "actors"],
+    @classmethod
+    def prepare_features(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean the text columns of ``df`` and add the ``soup`` column.
+
+        This is the column-wise equivalent of applying :meth:`clean_data` to
+        every cell and :meth:`create_soup` to every row, and yields the same
+        soup tokens. The director is repeated in the soup so it weighs twice
+        as much as a single actor or genre.
+        """
+        df = df.copy()
+        # Missing directors used to be written as "nan" in the soup.
+        df["director"] = cls._clean_column(df["director"].fillna("nan"))
+        df["actors"] = cls._clean_column(df["actors"])
+        df["genres"] = cls._clean_column(df["genres"])
+        df["soup"] = cls._soup(df)
+        return df
+
+    @staticmethod
+    def _soup(df: pd.DataFrame) -> pd.Series:
+        """Join the cleaned actors, director and genres of every row."""
+        return (
+            df["actors"]
+            + " "
+            + df["director"]
+            + " "
+            + df["director"]
+            + " "
+            + df["genres"]
         )
-        df["director"] = df["director"].apply(lambda x: [x, x])
-        for column in ["actors", "genres", "director"]:
-            df[column] = df[column].astype("str").apply(self.clean_data)
-        df["soup"] = df.apply(self.create_soup, axis=1)
-        count = CountVectorizer(stop_words="english")
-        count_matrix = count.fit_transform(df["soup"])
-        self.cosine_sim = cosine_similarity(count_matrix, count_matrix)
+
+    @staticmethod
+    def _clean_column(column: pd.Series) -> pd.Series:
+        """Vectorized :meth:`clean_data` for a column of strings or lists.
+
+        List cells are cleaned element-wise and joined with spaces, which
+        yields the same tokens as cleaning the repr of the list read back
+        from a CSV file.
+        """
+        missing = column.isna()
+        valid = column[~missing]
+        if len(valid) and pd.api.types.is_list_like(valid.iloc[0]):
+            flat = valid.explode().dropna()
+            cleaned = flat.astype(str).str.replace(" ", "", regex=False).str.lower()
+            joined = cleaned.groupby(level=0).agg(" ".join)
+            return joined.reindex(column.index, fill_value="")
+        cleaned = column.astype(str).str.replace(" ", "", regex=False).str.lower()
+        return cleaned.where(~missing, "")
+
+    def load_dataset(
+        self, dataset: str | Path, neighbors: str | Path | None = None
+    ) -> pd.DataFrame:
+        """Read the reduced dataset and prepare similarity data.
+
+        ``dataset`` is either the CSV file or the ``.npz`` bundle written by
+        :class:`MovieDatasetReducer`; the format is picked from the suffix.
+
+        In ``"topk"`` mode, ``neighbors`` may name a table written by
+        ``neighbors.py`` for this dataset. It is memory-mapped instead of
+        computing the neighbors, and ``top_k`` becomes the number of
+        neighbors it stores.
+        """
+        fingerprint = dataset_fingerprint(dataset)
+        table = None
+        if neighbors is not None:
+            if self.similarity != "topk":
+                raise ValueError("A neighbor table needs the topk similarity mode.")
+            table, metadata = NeighborTable.load(neighbors)
+            if metadata.get("dataset_hash") != fingerprint:
+                raise ValueError(
+                    f"Neighbor table at {neighbors} was built from another "
+                    "dataset. Rebuild it."
+                )
+        df = self._read_dataset(dataset)
+        if table is not None:
+            self.top_k = metadata["top_k"]
+        self._fit(df, table)
+        self.dataset_hash = fingerprint
+        return self.df
+
+    def load_features(self, dataset: str | Path) -> sparse.csr_matrix:
+        """Read ``dataset`` and fit only the L2-normalized feature matrix.
+
+        No similarity data is prepared, so :meth:`recommend` cannot be used
+        afterwards; this is for exporting the features, as ``neighbors.py``
+        does to build a neighbor table.
+        """
+        fingerprint = dataset_fingerprint(dataset)
+        self._fit(self._read_dataset(dataset), similarity_data=False)
+        self.dataset_hash = fingerprint
+        return self.features
+
+    def _read_dataset(self, dataset: str | Path) -> pd.DataFrame:
+        """Read ``dataset`` and return it with its feature soup prepared."""
+        with instrumentation.stage("load:read") as record:
+            if Path(dataset).suffix == ".npz":
+                df = read_columnar(dataset)
+                df = df[[name for name in DATASET_COLUMNS if name in df]]
+            else:
+                df = pd.read_csv(
+                    dataset,
+                    sep=",",
+                    encoding="utf-8",
+                    usecols=lambda name: name in DATASET_COLUMNS,
+                )
+            if "year" in df:
+                df["year"] = pd.to_numeric(df["year"], errors="coerce").astype(float)
+            record.rows_out = len(df)
+        with instrumentation.stage("load:prepare_features", len(df)) as record:
+            df = self.prepare_features(df)
+            record.rows_out = len(df)
+        return df
+
+    def _fit(
+        self,
+        df: pd.DataFrame,
+        neighbors: NeighborTable | None = None,
+        similarity_data: bool = True,
+    ) -> None:
+        """Fit the vectorizer and the similarity data to the prepared ``df``.
+
+        A given ``neighbors`` table is used instead of building one. With
+        ``similarity_data`` false only the feature matrix is fitted.
+        """
+        with instrumentation.stage("load:vectorizer_fit", len(df)) as record:
+            count = CountVectorizer(stop_words="english")
+            count_matrix = count.fit_transform(df["soup"])
+            record.rows_out = count_matrix.shape[0]
+        self.vectorizer = count
+        self.features = normalize(count_matrix)
+        self.cosine_sim = None
+        self.neighbors = None
+        self.ann_index = None
+        self._features_t = None
+        if similarity_data:
+            with instrumentation.stage(f"load:similarity:{self.similarity}", len(df)):
+                if neighbors is not None:
+                    self.neighbors = neighbors
+                elif self.similarity == "topk":
+                    # The movie itself usually ranks first, so keep one extra entry.
+                    self.neighbors = NeighborTable.build(
+                        self.features, self.top_k + 1, self.block_size
+                    )
+                elif self.similarity in ("query", "ann"):
+                    # Term-major copy so a query only touches the postings of its
+                    # terms.
+                    self._features_t = self.features.T.tocsr()
+                    if self.similarity == "ann":
+                        self.ann_index = MinHashLSHIndex(**self.ann_options).fit(
+                            self.features
+                        )
+                else:
+                    self.cosine_sim = cosine_similarity(count_matrix, count_matrix)
         df = df.reset_index(drop=True)
         self.indices = pd.Series(df.index, index=df["title"])
+        self._title_index = None
         self.df = df
-        return df
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def add_movies(self, movies: pd.DataFrame) -> np.ndarray:
+        """Add ``movies`` to the catalog without refitting the model.
 
-    def recommend(self, title: str, top_n: int = 10) -> pd.Series:
-        """Return ``top_n`` movie titles similar to ``title``."""
+        ``movies`` has the columns of a reduced dataset. Tokens not seen
+        before extend the vocabulary and only the similarities of the new
+        movies are computed, so a handful of movies is added in well under a
+        second. Returns the rows of the new movies.
+
+        The vocabulary is no longer sorted, and in ``"topk"`` mode neighbor
+        lists can drift from what a full build finds; :meth:`compact`
+        refits both. The model no longer matches its dataset file, so
+        :meth:`load_or_build` rebuilds it from the file.
+        """
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        required = ["title", "director", "genres", "score", "actors"]
+        missing = [name for name in required if name not in movies]
+        if missing:
+            raise ValueError(f"Movies lack the columns: {', '.join(missing)}.")
+        with instrumentation.stage("add_movies", len(movies)) as record:
+            movies = movies[[name for name in DATASET_COLUMNS if name in movies]]
+            if "year" in movies:
+                movies = movies.assign(
+                    year=pd.to_numeric(movies["year"], errors="coerce").astype(float)
+                )
+            movies = self.prepare_features(movies).reindex(columns=self.df.columns)
+            counts = self._count_tokens(movies["soup"])
+            self.features = sparse.vstack(
+                [self._widen(self.features), normalize(counts)], format="csr"
+            )
+            start = len(self.df)
+            self.df = pd.concat([self.df, movies], ignore_index=True)
+            rows = np.arange(start, len(self.df))
+            if self._title_index is not None:
+                added = self.df.iloc[start:]
+                self._title_index.extend(
+                    added["title"],
+                    added["year"] if "year" in added else None,
+                    added["tconst"] if "tconst" in added else None,
+                )
+            self._refresh(rows)
+            record.rows_out = len(rows)
+        return rows
+
+    def update_movie(
+        self,
+        title_or_row: str | int,
+        *,
+        match_year: int | None = None,
+        match_tconst: str | None = None,
+        **values,
+    ) -> int:
+        """Change the columns of one movie and refresh its similarities.
+
+        ``title_or_row`` is a dataset row or a title that picks the movie as
+        in :meth:`resolve`, narrowed by ``match_year`` or ``match_tconst``.
+        The other keyword arguments are the new column values, including
+        ``title``, ``year`` and ``tconst``, e.g.
+        ``actors=["Al Pacino", "Robert De Niro"]``. Returns the row of the
+        movie. See :meth:`add_movies` for how the model drifts.
+        """
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        unknown = sorted(set(values) - set(DATASET_COLUMNS))
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}.")
+        if isinstance(title_or_row, (int, np.integer)):
+            row = int(title_or_row)
+            if not 0 <= row < len(self.df):
+                raise ValueError(f"Row {row} is not in the dataset.")
+        else:
+            row = self.resolve(title_or_row, match_year, match_tconst)
+        text = ["director", "actors", "genres"]
+        cleaned = self.prepare_features(
+            pd.DataFrame({name: [values.get(name)] for name in text})
+        )
+        df = self.df.copy(deep=False)
+        for name, value in values.items():
+            if name in text:
+                value = cleaned[name].iat[0]
+            elif name == "year":
+                value = np.nan if value is None else float(value)
+            if name in df:
+                column = df[name].copy()
+            else:
+                dtype = float if name in ("year", "score") else object
+                column = pd.Series(np.nan, df.index, dtype=dtype)
+            column.iat[row] = value
+            df[name] = column
+        if any(name in text for name in values):
+            soup = df["soup"].copy()
+            soup.iat[row] = self._soup(df.iloc[[row]]).iat[0]
+            df["soup"] = soup
+            counts = self._count_tokens(df["soup"].iloc[[row]])
+            features = self._widen(self.features)
+            self.features = sparse.vstack(
+                [features[:row], normalize(counts), features[row + 1 :]], format="csr"
+            )
+        self.df = df
+        if {"title", "year", "tconst"} & set(values):
+            self._title_index = None
+        self._refresh(np.array([row]))
+        return row
+
+    def compact(self) -> None:
+        """Refit the vocabulary and the similarity data to the catalog.
+
+        Afterwards the model equals the one :meth:`load_dataset` builds from
+        a dataset with the same movies, undoing the drift of
+        :meth:`add_movies` and :meth:`update_movie`.
+        """
         if self.df is None:
             raise ValueError("Dataset not loaded. Call load_dataset first.")
-        if title not in self.indices:
-            raise ValueError("This movie is not in the dataset.")
-        idx = self.indices[title]
-        sim_scores = list(enumerate(self.cosine_sim[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1 : top_n + 1]
-        movie_indices = [i[0] for i in sim_scores]
-        return self.df["title"].iloc[movie_indices]
+        self._fit(self.df)
+
+    def _count_tokens(self, soups: pd.Series) -> sparse.csr_matrix:
+        """Count the tokens of ``soups``, adding new ones to the vocabulary."""
+        terms = list(self.vectorizer.get_feature_names_out())
+        vocabulary = {term: column for column, term in enumerate(terms)}
+        analyzer = self.vectorizer.build_analyzer()
+        indices, indptr = [], [0]
+        for soup in soups:
+            indices.extend(
+                vocabulary.setdefault(token, len(vocabulary))
+                for token in analyzer(soup)
+            )
+            indptr.append(len(indices))
+        if len(vocabulary) > len(terms):
+            self.vectorizer = CountVectorizer(
+                stop_words="english", vocabulary=list(vocabulary)
+            )
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices)), indices, indptr),
+            shape=(len(soups), len(vocabulary)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def _widen(self, features: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Return ``features`` with a column for every vocabulary term."""
+        width = len(self.vectorizer.get_feature_names_out())
+        return sparse.csr_matrix(
+            (features.data, features.indices, features.indptr),
+            shape=(features.shape[0], width),
+        )
+
+    def _refresh(self, rows: np.ndarray) -> None:
+        """Recompute the similarity data of ``rows`` after their features changed."""
+        if self.neighbors is not None:
+            self.neighbors = self.neighbors.update(
+                self.features, rows, self.top_k + 1, self.block_size
+            )
+        elif self.cosine_sim is not None:
+            n, old = self.features.shape[0], len(self.cosine_sim)
+            similarities = (self.features[rows] @ self.features.T).toarray()
+            cosine_sim = np.zeros((n, n))
+            cosine_sim[:old, :old] = self.cosine_sim
+            cosine_sim[rows] = similarities
+            cosine_sim[:, rows] = similarities.T
+            self.cosine_sim = cosine_sim
+        else:
+            self._features_t = self.features.T.tocsr()
+            if self.ann_index is not None:
+                self.ann_index.update(self.features, rows)
+        self.indices = pd.Series(self.df.index, index=self.df["title"])
+        self.dataset_hash = None
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def save_model(self, path: str | Path) -> Path:
+        """Save the fitted model to the ``path`` directory.
+
+        Every array is written to its own ``.npy`` file so
+        :meth:`load_model` can memory-map it instead of reading it. The
+        directory is replaced atomically.
+        """
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        path = Path(path)
+        arrays = {}
+        self._add_sparse_arrays(arrays, "features", self.features)
+        if self._features_t is not None:
+            self._add_sparse_arrays(arrays, "features_t", self._features_t)
+        if self.cosine_sim is not None:
+            arrays["cosine_sim"] = self.cosine_sim
+        if self.neighbors is not None:
+            arrays["neighbors_indptr"] = self.neighbors.indptr
+            arrays["neighbors_indices"] = self.neighbors.indices
+            arrays["neighbors_scores"] = self.neighbors.scores
+        if self.ann_index is not None:
+            arrays["ann_keys"] = self.ann_index.keys
+            arrays["ann_order"] = self.ann_index.order
+            arrays["ann_sorted_keys"] = self.ann_index.sorted_keys
+        arrays["vocabulary_offsets"], arrays["vocabulary_data"] = encode_strings(
+            self.vectorizer.get_feature_names_out()
+        )
+        columns = {}
+        for name in self.df.columns:
+            column = self.df[name]
+            if pd.api.types.is_numeric_dtype(column):
+                columns[name] = "numeric"
+                arrays[f"column_{name}"] = column.to_numpy()
+                continue
+            columns[name] = "string"
+            nulls = column.isna().to_numpy()
+            if nulls.any():
+                arrays[f"column_{name}_nulls"] = nulls
+            offsets, data = encode_strings(column.where(~nulls, ""))
+            arrays[f"column_{name}_offsets"] = offsets
+            arrays[f"column_{name}_data"] = data
+        metadata = {
+            "format": MODEL_FORMAT_VERSION,
+            "similarity": self.similarity,
+            "top_k": self.top_k,
+            "ann": self.ann_options,
+            "dataset_hash": self.dataset_hash,
+            "columns": columns,
+            "arrays": sorted(arrays),
+            "features_shape": list(self.features.shape),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+        try:
+            for name, array in arrays.items():
+                np.save(staging / f"{name}.npy", np.asarray(array))
+            (staging / "model.json").write_text(
+                json.dumps(metadata, indent=2), encoding="utf-8"
+            )
+            replace_directory(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return path
+
+    @classmethod
+    def load_model(cls, path: str | Path, mmap: bool = True) -> "MovieRecommender":
+        """Load a model written by :meth:`save_model`.
+
+        With ``mmap`` the similarity and feature arrays are memory-mapped
+        read-only, so opening the model costs little more than reading the
+        titles.
+        """
+        path = Path(path)
+        metadata = _read_model_metadata(path)
+        if metadata is None:
+            raise ValueError(f"No saved model found at {path}.")
+        if metadata.get("format") != MODEL_FORMAT_VERSION:
+            raise ValueError(
+                f"Saved model at {path} uses an unsupported format. Rebuild it."
+            )
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in metadata["arrays"]
+        }
+        ann = metadata["ann"]
+        recommender = cls(
+            similarity=metadata["similarity"],
+            top_k=metadata["top_k"],
+            ann_bands=ann["bands"],
+            ann_rows=ann["rows"],
+            ann_candidates=ann["max_candidates"],
+        )
+        recommender.dataset_hash = metadata["dataset_hash"]
+        shape = tuple(metadata["features_shape"])
+        recommender.features = cls._sparse_from_arrays(arrays, "features", shape)
+        if "features_t_data" in arrays:
+            recommender._features_t = cls._sparse_from_arrays(
+                arrays, "features_t", shape[::-1]
+            )
+        recommender.cosine_sim = arrays.get("cosine_sim")
+        if "neighbors_indptr" in arrays:
+            recommender.neighbors = NeighborTable(
+                arrays["neighbors_indptr"],
+                arrays["neighbors_indices"],
+                arrays["neighbors_scores"],
+            )
+        if "ann_keys" in arrays:
+            recommender.ann_index = MinHashLSHIndex(**ann)
+            recommender.ann_index.keys = arrays["ann_keys"]
+            recommender.ann_index.order = arrays["ann_order"]
+            recommender.ann_index.sorted_keys = arrays["ann_sorted_keys"]
+        recommender.vectorizer = CountVectorizer(
+            stop_words="english",
+            vocabulary=decode_strings(
+                arrays["vocabulary_offsets"], arrays["vocabulary_data"]
+            ),
+        )
+        df = pd.DataFrame(index=pd.RangeIndex(shape[0]))
+        for name, kind in metadata["columns"].items():
+            if kind == "numeric":
+                df[name] = np.asarray(arrays[f"column_{name}"])
+                continue
+            values = pd.Series(
+                decode_strings(
+                    arrays[f"column_{name}_offsets"], arrays[f"column_{name}_data"]
+                ),
+                index=df.index,
+            )
+            if f"column_{name}_nulls" in arrays:
+                values = values.mask(np.asarray(arrays[f"column_{name}_nulls"]))
+            df[name] = values
+        recommender.indices = pd.Series(df.index, index=df["title"])
+        recommender.df = df
+        return recommender
+
+    @classmethod
+    def load_or_build(
+        cls, dataset: str | Path, model_path: str | Path, **options
+    ) -> "MovieRecommender":
+        """Load the model saved at ``model_path`` or rebuild it from ``dataset``.
+
+        The saved model is reused only when it was built from a dataset with
+        the same content hash and with the same similarity options. Otherwise
+        the model is rebuilt and saved over the stale artifact.
+
+        The check and the rebuild hold a file lock, so when several worker
+        processes start together only one of them builds the model. All of
+        them then return the memory-mapped artifact, which the operating
+        system shares between processes instead of copying it into each.
+        """
+        model_path = Path(model_path)
+        recommender = cls(**options)
+        with _model_lock(model_path):
+            metadata = _read_model_metadata(model_path)
+            if not (
+                metadata is not None
+                and metadata.get("format") == MODEL_FORMAT_VERSION
+                and metadata.get("similarity") == recommender.similarity
+                and metadata.get("top_k") == recommender.top_k
+                and metadata.get("ann") == recommender.ann_options
+                and metadata.get("dataset_hash") == dataset_fingerprint(dataset)
+            ):
+                recommender.load_dataset(dataset)
+                recommender.save_model(model_path)
+            loaded = cls.load_model(model_path)
+        loaded.result_cache = recommender.result_cache
+        return loaded
+
+    @staticmethod
+    def _add_sparse_arrays(
+        arrays: dict[str, np.ndarray], name: str, matrix: sparse.csr_matrix
+    ) -> None:
+        arrays[f"{name}_data"] = matrix.data
+        arrays[f"{name}_indices"] = matrix.indices
+        arrays[f"{name}_indptr"] = matrix.indptr
+
+    @staticmethod
+    def _sparse_from_arrays(
+        arrays: dict[str, np.ndarray], name: str, shape: tuple[int, int]
+    ) -> sparse.csr_matrix:
+        return sparse.csr_matrix(
+            (
+                arrays[f"{name}_data"],
+                arrays[f"{name}_indices"],
+                arrays[f"{name}_indptr"],
+            ),
+            shape=shape,
+            copy=False,
+        )
+
+    @property
+    def title_index(self) -> TitleIndex:
+        """:class:`TitleIndex` over the loaded titles, built on first use."""
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        if self._title_index is None:
+            self._title_index = TitleIndex(
+                self.df["title"],
+                self.df["year"] if "year" in self.df else None,
+                self.df["tconst"] if "tconst" in self.df else None,
+            )
+        return self._title_index
+
+    def find_titles(self, query: str, limit: int = 10) -> pd.DataFrame:
+        """Return up to ``limit`` movies matching the prefix or typo ``query``.
+
+        The result has the ``title``, ``label`` and, when the dataset has
+        them, ``year`` and ``tconst`` columns. ``label`` adds the year to the
+        title and is accepted by :meth:`recommend`.
+        """
+        index = self.title_index
+        rows = index.search(query, limit)
+        columns = [name for name in ("title", "year", "tconst") if name in self.df]
+        matches = self.df[columns].iloc[rows].reset_index(drop=True)
+        matches["label"] = [index.label(row) for row in rows]
+        return matches
+
+    def resolve(
+        self, title: str, year: int | None = None, tconst: str | None = None
+    ) -> int:
+        """Return the row of ``title``, using ``year`` or ``tconst`` for duplicates.
+
+        Titles are matched case-insensitively. Without ``year`` or
+        ``tconst`` the most popular movie of that title is picked.
+        """
+        rows = self.title_index.lookup(title, year, tconst)
+        if len(rows) == 0:
+            message = "This movie is not in the dataset."
+            similar, _ = self.title_index.fuzzy(title, 3)
+            if len(similar):
+                labels = [self.title_index.label(row) for row in similar]
+                message += " Did you mean: " + ", ".join(labels) + "?"
+            raise ValueError(message)
+        return int(rows[0])
+
+    def recommend(
+        self,
+        title: str | None = None,
+        top_n: int = 10,
+        year: int | None = None,
+        tconst: str | None = None,
+        titles: Iterable[str] | None = None,
+    ) -> pd.Series:
+        """Return ``top_n`` movie titles similar to ``title``.
+
+        See :meth:`resolve` for how ``title``, ``year`` and ``tconst`` pick
+        the movie. Pass ``titles`` instead of ``title`` to get movies similar
+        to several seeds at once; the seeds themselves are never returned.
+        """
+        if not instrumentation.METRICS.enabled:
+            return self._recommend(title, top_n, year, tconst, titles)
+        start = time.perf_counter()
+        try:
+            return self._recommend(title, top_n, year, tconst, titles)
+        finally:
+            instrumentation.observe_latency(
+                "recommend", time.perf_counter() - start, similarity=self.similarity
+            )
+
+    def _recommend(
+        self,
+        title: str | None,
+        top_n: int,
+        year: int | None,
+        tconst: str | None,
+        titles: Iterable[str] | None,
+    ) -> pd.Series:
+        if isinstance(titles, str):
+            titles = [titles]
+        elif titles is not None:
+            titles = list(titles)
+        key = (title, top_n, year, tconst, None if titles is None else tuple(titles))
+        if self.result_cache is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return cached.copy()
+        if titles is not None:
+            if title is not None:
+                raise ValueError("Pass either title or titles, not both.")
+            rows = np.unique([self.resolve(seed) for seed in titles])
+            if len(rows) == 0:
+                raise ValueError("Pass at least one title.")
+            movie_indices, _ = self._rank_profile(rows, top_n)
+        elif title is None:
+            raise ValueError("Pass a title to recommend movies for.")
+        else:
+            idx = self.resolve(title, year, tconst)
+            movie_indices = self._rank(np.array([idx]), top_n)[0][0]
+        recommendations = self.df["title"].iloc[movie_indices]
+        if self.result_cache is not None:
+            self.result_cache.set(key, recommendations.copy())
+        return recommendations
+
+    def recommend_many(self, titles: Iterable[str], top_n: int = 10) -> pd.DataFrame:
+        """Return recommendations for several titles in one vectorized pass.
+
+        Every title is resolved like in :meth:`recommend`. The result has one
+        row per recommendation with the columns ``query``, ``rank`` (starting
+        at 1), ``title`` and ``score``.
+        """
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        titles = list(titles)
+        rows = np.empty(len(titles), dtype=np.int64)
+        missing = []
+        for position, title in enumerate(titles):
+            try:
+                rows[position] = self.resolve(title)
+            except ValueError:
+                missing.append(title)
+        if missing:
+            raise ValueError(
+                "These movies are not in the dataset: " + ", ".join(missing)
+            )
+        movie_indices, scores = self._rank(rows, top_n)
+        width = movie_indices.shape[1]
+        return pd.DataFrame(
+            {
+                "query": np.repeat(titles, width),
+                "rank": np.tile(np.arange(1, width + 1), len(titles)),
+                "title": self.df["title"].to_numpy()[movie_indices.ravel()],
+                "score": scores.ravel(),
+            }
+        )
+
+    def iter_recommendations(
+        self, titles: Iterable[str], top_n: int = 10, batch_size: int | None = None
+    ) -> Iterator[pd.DataFrame]:
+        """Yield recommendations for a stream of titles, one batch at a time.
+
+        ``titles`` is consumed lazily and every title is resolved like in
+        :meth:`recommend`, so ``"Heat (1995)"`` labels work. Each batch is
+        ranked in one vectorized pass and yielded as a frame with the columns
+        of :meth:`recommend_many` plus ``error``, in input order. A title that
+        cannot be resolved gets a single row holding the error message
+        instead of failing the batch. By default a batch holds as many titles
+        as fit about 64 MiB of similarity scores.
+        """
+        if self.df is None:
+            raise ValueError("Dataset not loaded. Call load_dataset first.")
+        if batch_size is None:
+            batch_size = max(1, BATCH_BLOCK_BYTES // (8 * len(self.df)))
+        titles = iter(titles)
+        while batch := list(itertools.islice(titles, batch_size)):
+            rows = np.full(len(batch), -1, dtype=np.int64)
+            errors = [None] * len(batch)
+            for position, title in enumerate(batch):
+                try:
+                    rows[position] = self.resolve(title)
+                except ValueError as exc:
+                    errors[position] = str(exc)
+            yield self._batch_frame(batch, rows, errors, top_n)
+
+    def _batch_frame(
+        self, titles: list[str], rows: np.ndarray, errors: list[str | None], top_n: int
+    ) -> pd.DataFrame:
+        """Rank the resolved ``rows`` and lay out one batch of results."""
+        found = rows >= 0
+        if found.any():
+            movie_indices, scores = self._rank(rows[found], top_n)
+        else:
+            movie_indices, scores = np.empty((0, 0), dtype=np.int64), np.empty((0, 0))
+        width = movie_indices.shape[1]
+        counts = np.where(found, width, 1)
+        hit = np.repeat(found, counts)
+        ranks = np.zeros(len(hit), dtype=np.int64)
+        ranks[hit] = np.tile(np.arange(1, width + 1), int(found.sum()))
+        recommended = np.full(len(hit), None, dtype=object)
+        recommended[hit] = self.df["title"].to_numpy()[movie_indices.ravel()]
+        similarities = np.full(len(hit), np.nan)
+        similarities[hit] = scores.ravel()
+        messages = np.full(len(hit), None, dtype=object)
+        messages[~hit] = [errors[position] for position in np.flatnonzero(~found)]
+        return pd.DataFrame(
+            {
+                "query": np.repeat(np.asarray(titles, dtype=object), counts),
+                "rank": pd.arrays.IntegerArray(ranks, ~hit),
+                "title": recommended,
+                "score": similarities,
+                "error": messages,
+            }
+        )
+
+    def _rank(self, rows: np.ndarray, top_n: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the ``top_n`` most similar movies to each of ``rows``.
+
+        Both returned arrays have one row per query; the queried movie itself
+        (normally the best match) is dropped like in the original dense path.
+        """
+        if self.neighbors is not None:
+            if top_n > self.top_k:
+                raise ValueError(
+                    f"top_n cannot exceed top_k ({self.top_k}) in topk mode."
+                )
+            width = min(top_n + 1, self.neighbors.k)
+            positions = self.neighbors.indptr[rows][:, None] + np.arange(1, width)
+            return self.neighbors.indices[positions], self.neighbors.scores[positions]
+        if self.ann_index is not None:
+            return self._rank_approximate(rows, top_n)
+        if self._features_t is not None:
+            sim = (self.features[rows] @ self._features_t).toarray()
+        else:
+            sim = self.cosine_sim[rows]
+        top = top_k_indices(sim, top_n + 1)[:, 1:]
+        return top, np.take_along_axis(sim, top, axis=1)
+
+    def _rank_profile(
+        self, rows: np.ndarray, top_n: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the ``top_n`` movies most similar to all of ``rows`` combined.
+
+        The seed feature rows are summed into one profile with a single
+        sparse product, so the cost barely depends on the number of seeds.
+        Scores are cosine similarities to the profile.
+        """
+        n = self.features.shape[0]
+        seeds = sparse.csr_matrix(
+            (np.ones(len(rows)), (np.zeros(len(rows), dtype=np.intp), rows)),
+            shape=(1, n),
+        )
+        profile = normalize(seeds @ self.features)
+        if self._features_t is not None:
+            sim = (profile @ self._features_t).toarray()[0]
+        else:
+            sim = (self.features @ profile.T).toarray()[:, 0]
+        sim[rows] = -np.inf
+        top = top_k_indices(sim, min(top_n, n - len(rows)))[0]
+        return top, sim[top]
+
+    def _rank_approximate(
+        self, rows: np.ndarray, top_n: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rank the LSH candidates of each row by exact cosine similarity.
+
+        Rows whose buckets hold fewer than ``top_n`` other movies fall back
+        to scoring the whole catalog.
+        """
+        width = min(top_n, self.features.shape[0] - 1)
+        indices = np.empty((len(rows), width), dtype=np.intp)
+        scores = np.empty((len(rows), width))
+        for position, row in enumerate(rows):
+            found, found_scores = approximate_top_k(
+                self.features, self.ann_index, row, width
+            )
+            if found.size < width:
+                sim = (self.features[[row]] @ self._features_t).toarray()
+                found = top_k_indices(sim, width + 1)[0, 1:]
+                found_scores = sim[0, found]
+            indices[position] = found
+            scores[position] = found_scores
+        return indices, scores
@@ -0,0 +1,350 @@
+"""Sparse top-k neighbor storage for movie similarities."""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+# Upper bound for the dense similarity block materialized at once.
+_BLOCK_BYTES = 64 * 2**20
+
+# Bump whenever the layout written by ``NeighborTable.save`` changes.
+TABLE_FORMAT_VERSION = 1
+
+# Feature matrix and its transpose, set in each process pool worker.
+_worker_features = None
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the column indices of the ``k`` largest values in each row.
+
+    Each row of the result is ordered by descending score. Ties keep the
+    lower column index first, which matches a stable descending sort of the
+    whole row.
+    """
+    scores = np.atleast_2d(scores)
+    n_rows, n_cols = scores.shape
+    k = max(0, min(k, n_cols))
+    if k == n_cols:
+        return np.argsort(-scores, axis=1, kind="stable")
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    kth = np.take_along_axis(scores, part, axis=1).min(axis=1)
+    # Every entry tied with the k-th value is a candidate; ordering them by
+    # (row, -score, column) resolves the ties deterministically.
+    rows, cols = np.nonzero(scores >= kth[:, None])
+    order = np.lexsort((cols, -scores[rows, cols], rows))
+    rows, cols = rows[order], cols[order]
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    rank = np.arange(rows.size) - starts[rows]
+    return cols[rank < k].reshape(n_rows, k)
+
+
+def replace_directory(source: Path, target: Path) -> None:
+    """Move ``source`` to ``target``, replacing any previous directory.
+
+    Processes that memory-mapped the previous files keep their mappings.
+    """
+    backup = None
+    if target.exists():
+        backup = target.with_name(f".{target.name}-old-{os.getpid()}")
+        os.replace(target, backup)
+    os.replace(source, target)
+    if backup is not None:
+        shutil.rmtree(backup, ignore_errors=True)
+
+
+class NeighborTable:
+    """Top-k neighbors of every movie stored in CSR-style arrays.
+
+    Row ``i`` owns ``indices[indptr[i]:indptr[i + 1]]`` and the matching
+    ``scores``, ordered from most to least similar.
+    """
+
+    def __init__(
+        self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray
+    ) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def k(self) -> int:
+        """Smallest number of neighbors stored for any row."""
+        if len(self) == 0:
+            return 0
+        return int(np.diff(self.indptr).min())
+
+    def neighbors(self, row: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(indices, scores)`` of the neighbors stored for ``row``."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.scores[start:end]
+
+    @classmethod
+    def build(
+        cls,
+        features: sparse.spmatrix,
+        k: int,
+        block_size: int | None = None,
+        workers: int = 1,
+    ) -> "NeighborTable":
+        """Compute the ``k`` most similar rows of L2-normalized ``features``.
+
+        Similarities are computed ``block_size`` rows at a time so only one
+        dense ``block_size x n`` block is held in memory. With several
+        ``workers`` the blocks are spread over a process pool; every worker
+        holds a copy of ``features`` and one block at a time.
+        """
+        features = sparse.csr_matrix(features)
+        n = features.shape[0]
+        k = min(k, n)
+        if workers > 1:
+            indices, scores = _top_k_rows_parallel(features, k, block_size, workers)
+        else:
+            indices, scores = _top_k_rows(features, features, k, block_size)
+        indptr = np.arange(n + 1, dtype=np.int64) * k
+        return cls(indptr, indices.ravel(), scores.ravel())
+
+    def save(self, path: str | Path, **metadata) -> Path:
+        """Write the table to the ``path`` directory.
+
+        Every array goes to its own ``.npy`` file so :meth:`load` can
+        memory-map it; ``metadata`` is stored next to them as JSON. The
+        files are written to a temporary directory that then replaces
+        ``path``, so an interrupted save never leaves a partial table.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+        try:
+            np.save(staging / "indptr.npy", np.asarray(self.indptr, dtype=np.int64))
+            np.save(staging / "indices.npy", np.asarray(self.indices, dtype=np.int32))
+            np.save(staging / "scores.npy", np.asarray(self.scores, dtype=np.float32))
+            metadata = {"format": TABLE_FORMAT_VERSION, "rows": len(self), **metadata}
+            (staging / "neighbors.json").write_text(
+                json.dumps(metadata, indent=2), encoding="utf-8"
+            )
+            replace_directory(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> tuple["NeighborTable", dict]:
+        """Return the table saved at ``path`` and its metadata."""
+        path = Path(path)
+        try:
+            metadata = json.loads((path / "neighbors.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raise ValueError(f"No neighbor table found at {path}.") from None
+        if metadata.get("format") != TABLE_FORMAT_VERSION:
+            raise ValueError(
+                f"Neighbor table at {path} uses an unsupported format. Rebuild it."
+            )
+        mmap_mode = "r" if mmap else None
+        table = cls(
+            *(
+                np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                for name in ("indptr", "indices", "scores")
+            )
+        )
+        return table, metadata
+
+    def update(
+        self,
+        features: sparse.spmatrix,
+        rows: np.ndarray,
+        k: int,
+        block_size: int | None = None,
+    ) -> "NeighborTable":
+        """Return a table where the similarities of ``rows`` are recomputed.
+
+        ``features`` is the current L2-normalized feature matrix; its rows
+        past the end of the table are new and must be among ``rows``. The
+        ``k`` neighbors of ``rows`` are computed against every row. Every
+        other row rescores its entries for ``rows`` and takes in those of
+        ``rows`` that now beat its weakest neighbor. It is not searched for
+        a movie to replace one whose score dropped, which only :meth:`build`
+        finds.
+        """
+        features = sparse.csr_matrix(features)
+        n, n_old = features.shape[0], len(self)
+        k = min(k, n)
+        rows = np.unique(rows)
+        changed = np.zeros(n, dtype=bool)
+        changed[rows] = True
+        if not changed[n_old:].all():
+            raise ValueError("New rows must be among the updated rows.")
+
+        # Similarity of every row to each changed row, keyed by
+        # ``owner * n + neighbor``.
+        pairs = (features @ features[rows].T).tocoo()
+        pair_keys = pairs.row.astype(np.int64) * n + rows[pairs.col]
+        order = np.argsort(pair_keys)
+        pair_keys, pair_scores = pair_keys[order], pairs.data[order]
+
+        lengths = np.diff(self.indptr)
+        owners = np.repeat(np.arange(n_old), lengths)
+        indices = np.asarray(self.indices, dtype=np.int64)
+        scores = np.asarray(self.scores, dtype=np.float64)
+        stale = changed[indices] & ~changed[owners]
+        rescored = scores.copy()
+        rescored[stale] = _lookup(
+            pair_keys, pair_scores, owners[stale] * n + indices[stale]
+        )
+
+        # Full lists take in the changed rows that beat their weakest entry,
+        # shorter lists every changed row.
+        threshold = np.full(n, -np.inf)
+        filled = np.flatnonzero(lengths)
+        if len(filled):
+            weakest = np.minimum.reduceat(rescored, self.indptr[filled])
+            full = lengths[filled] >= k
+            threshold[filled[full]] = weakest[full]
+        pair_owners, pair_neighbors = np.divmod(pair_keys, n)
+        take = ~changed[pair_owners] & (pair_scores > threshold[pair_owners])
+        short = np.flatnonzero((lengths < k) & ~changed[:n_old])
+        short_owners = np.repeat(short, len(rows))
+        short_neighbors = np.tile(rows, len(short))
+
+        affected = changed.copy()
+        affected[owners[stale]] = True
+        affected[pair_owners[take]] = True
+        affected[short] = True
+        redo = affected[owners] & ~changed[owners]
+        fresh_indices, fresh_scores = _top_k_rows(
+            features[rows], features, k, block_size
+        )
+        new_owners = np.concatenate(
+            [
+                owners[redo],
+                pair_owners[take],
+                short_owners,
+                np.repeat(rows, fresh_indices.shape[1]),
+            ]
+        )
+        new_indices = np.concatenate(
+            [
+                indices[redo],
+                pair_neighbors[take],
+                short_neighbors,
+                fresh_indices.ravel(),
+            ]
+        )
+        new_scores = np.concatenate(
+            [
+                rescored[redo],
+                pair_scores[take],
+                _lookup(pair_keys, pair_scores, short_owners * n + short_neighbors),
+                fresh_scores.ravel(),
+            ]
+        )
+        _, unique = np.unique(new_owners * n + new_indices, return_index=True)
+        new_owners = new_owners[unique]
+        new_indices = new_indices[unique]
+        new_scores = new_scores[unique]
+        # Same order as :func:`top_k_indices`: best score, then lowest index.
+        order = np.lexsort((new_indices, -new_scores, new_owners))
+        new_owners = new_owners[order]
+        rank = np.arange(len(order)) - np.searchsorted(new_owners, new_owners)
+        keep = rank < k
+        order = order[keep]
+
+        kept = ~affected[owners]
+        all_owners = np.concatenate([owners[kept], new_owners[keep]])
+        merged = np.argsort(all_owners, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_owners, minlength=n), out=indptr[1:])
+        return NeighborTable(
+            indptr,
+            np.concatenate([self.indices[kept], new_indices[order]])[merged].astype(
+                np.int32
+            ),
+            np.concatenate([self.scores[kept], new_scores[order]])[merged].astype(
+                np.float32
+            ),
+        )
+
+
+def _lookup(keys: np.ndarray, values: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Return ``values`` at the sorted ``keys`` matching ``query``, else 0."""
+    if len(keys) == 0:
+        return np.zeros(len(query))
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return np.where(keys[found] == query, values[found], 0.0)
+
+
+def _init_worker(features: sparse.csr_matrix) -> None:
+    """Keep ``features`` and its transpose for the blocks of this worker."""
+    global _worker_features
+    _worker_features = (features, features.T.tocsr())
+
+
+def _top_k_block(start: int, end: int, k: int) -> tuple[int, np.ndarray, np.ndarray]:
+    """Return the neighbors of rows ``start:end`` in a pool worker."""
+    features, transposed = _worker_features
+    block = (features[start:end] @ transposed).toarray()
+    top = top_k_indices(block, k)
+    scores = np.take_along_axis(block, top, axis=1)
+    return start, top.astype(np.int32), scores.astype(np.float32)
+
+
+def _top_k_rows_parallel(
+    features: sparse.csr_matrix, k: int, block_size: int | None, workers: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Like :func:`_top_k_rows` for all rows, with blocks spread over a pool."""
+    n = features.shape[0]
+    if block_size is None:
+        block_size = max(1, _BLOCK_BYTES // max(1, n * 8))
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(features,)
+    ) as pool:
+        futures = [
+            pool.submit(_top_k_block, start, min(start + block_size, n), k)
+            for start in range(0, n, block_size)
+        ]
+        for future in futures:
+            start, top, block_scores = future.result()
+            indices[start : start + len(top)] = top
+            scores[start : start + len(top)] = block_scores
+    return indices, scores
+
+
+def _top_k_rows(
+    queries: sparse.csr_matrix,
+    features: sparse.csr_matrix,
+    k: int,
+    block_size: int | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the ``k`` rows of ``features`` most similar to each query row.
+
+    Similarities are computed ``block_size`` queries at a time so only one
+    dense ``block_size x n`` block is held in memory.
+    """
+    n = features.shape[0]
+    if block_size is None:
+        block_size = max(1, _BLOCK_BYTES // max(1, n * 8))
+    indices = np.empty((queries.shape[0], k), dtype=np.int32)
+    scores = np.empty((queries.shape[0], k), dtype=np.float32)
+    transposed = features.T.tocsr()
+    for start in range(0, queries.shape[0], block_size):
+        end = min(start + block_size, queries.shape[0])
+        block = (queries[start:end] @ transposed).toarray()
+        top = top_k_indices(block, k)
+        indices[start:end] = top
+        scores[start:end] = np.take_along_axis(block, top, axis=1)
+    return indices, scores
@@ -0,0 +1,225 @@
+"""Synthetic IMDb dumps and reduced datasets for benchmarks and tests."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .dataset_reducer import (
+    NAME_BASICS,
+    TITLE_BASICS,
+    TITLE_CREW,
+    TITLE_PRINCIPALS,
+    TITLE_RATINGS,
+)
+
+GENRES = np.array(
+    """Action Adult Adventure Animation Biography Comedy Crime Documentary Drama
+    Family Fantasy Film-Noir History Horror Music Musical Mystery News
+    Reality-TV Romance Sci-Fi Short Sport Thriller War Western""".split()
+)
+TITLE_TYPES = np.array(["movie", "short", "tvSeries", "tvEpisode", "video"])
+TITLE_TYPE_SHARES = [0.7, 0.1, 0.08, 0.07, 0.05]
+
+_TITLE_WORDS = np.array(
+    """the of a night day love man last city house dark lost return king story
+    dead life girl world time blood star secret black white red blue war road
+    home heart river moon sun fire ice shadow dream storm island summer winter
+    little big great wild long lady boy family death ghost game hunter killer
+    song journey legend empire kingdom garden street train wolf angel devil
+    queen prince stranger silence murder escape beyond under after before
+    between inside golden last first final new old lonely broken hidden""".split()
+)
+_FIRST_NAMES = np.array(
+    """James Mary John Patricia Robert Jennifer Michael Linda William Elizabeth
+    David Barbara Richard Susan Joseph Jessica Thomas Sarah Charles Karen
+    Daniel Nancy Matthew Lisa Anthony Betty Mark Margaret Paul Sandra Steven
+    Ashley Andrew Kimberly Kenneth Emily Joshua Donna Kevin Michelle Brian
+    Carol George Amanda Edward Melissa Ronald Deborah Timothy Stephanie Jason
+    Rebecca Jeffrey Laura Ryan Helen Jacob Sharon Gary Cynthia Nicholas
+    Kathleen Eric Amy Jonathan Shirley Stephen Angela Larry Anna Justin Ruth
+    Scott Brenda Brandon Pamela Frank Nicole Benjamin Katherine Gregory
+    Virginia Samuel Catherine Raymond Christine Patrick Samantha Alexander
+    Debra Jack Janet Dennis Rachel Jerry Carolyn Tyler Emma Aaron Maria""".split()
+)
+_LAST_NAMES = np.array(
+    """Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez
+    Martinez Hernandez Lopez Gonzalez Wilson Anderson Thomas Taylor Moore
+    Jackson Martin Lee Perez Thompson White Harris Sanchez Clark Ramirez Lewis
+    Robinson Walker Young Allen King Wright Scott Torres Nguyen Hill Flores
+    Green Adams Nelson Baker Hall Rivera Campbell Mitchell Carter Roberts
+    Gomez Phillips Evans Turner Diaz Parker Cruz Edwards Collins Reyes Stewart
+    Morris Morales Murphy Cook Rogers Gutierrez Ortiz Morgan Cooper Peterson
+    Bailey Reed Kelly Howard Ramos Kim Cox Ward Richardson Watson Brooks
+    Chavez Wood James Bennett Gray Mendoza Ruiz Hughes Price Alvarez Castillo
+    Sanders Patel Myers Long Ross Foster Jimenez""".split()
+)
+_CREW_CATEGORIES = np.array(["director", "writer", "producer", "composer"])
+
+
+def _ids(prefix: str, count: int) -> pd.Series:
+    """Return IMDb style ids such as ``tt0000001`` for ``1..count``."""
+    numbers = pd.Series(np.arange(1, count + 1)).astype(str).str.zfill(7)
+    return prefix + numbers
+
+
+def _titles(rng: np.random.Generator, count: int) -> list[str]:
+    """Return ``count`` titles of one to four words; some repeat."""
+    words = _TITLE_WORDS[rng.integers(0, len(_TITLE_WORDS), (count, 4))]
+    lengths = rng.integers(1, 5, count)
+    return [" ".join(row[:length]).title() for row, length in zip(words, lengths)]
+
+
+def _genres(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Return comma separated genre lists, ``\\N`` for a few titles."""
+    picks = GENRES[rng.integers(0, len(GENRES), (count, 3))]
+    lengths = rng.integers(1, 4, count)
+    genres = np.array(
+        [",".join(dict.fromkeys(row[:length])) for row, length in zip(picks, lengths)],
+        dtype=object,
+    )
+    genres[rng.random(count) < 0.03] = "\\N"
+    return genres
+
+
+def _popular(rng: np.random.Generator, pool: int, size: int) -> np.ndarray:
+    """Draw ``size`` indices below ``pool`` where low indices are common."""
+    return (rng.zipf(1.3, size) - 1) % pool
+
+
+def write_synthetic_dumps(
+    directory: str | Path, titles: int, seed: int = 0
+) -> dict[str, Path]:
+    """Write the five IMDb TSV dumps read by the reducer for ``titles`` titles.
+
+    The dumps follow the real column layout and rough distributions: about
+    70% of titles are movies, vote counts are heavy tailed, most titles have
+    a single director and a handful of principals, and popular people appear
+    in many titles. Returns the path of every dump keyed by its file name.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tconst = _ids("tt", titles)
+    people = max(10, titles * 2)
+    nconst = _ids("nm", people)
+    directors = max(1, people // 10)
+
+    title_types = rng.choice(TITLE_TYPES, titles, p=TITLE_TYPE_SHARES)
+    names = _titles(rng, titles)
+    years = rng.integers(1920, 2025, titles).astype(str).astype(object)
+    years[rng.random(titles) < 0.02] = "\\N"
+    basics = pd.DataFrame(
+        {
+            "tconst": tconst,
+            "titleType": title_types,
+            "primaryTitle": names,
+            "originalTitle": names,
+            "isAdult": 0,
+            "startYear": years,
+            "endYear": "\\N",
+            "runtimeMinutes": rng.integers(5, 200, titles),
+            "genres": _genres(rng, titles),
+        }
+    )
+
+    first = _popular(rng, directors, titles)
+    second = _popular(rng, directors, titles)
+    crew_directors = nconst.to_numpy()[first].astype(object)
+    two = rng.random(titles) < 0.1
+    crew_directors[two] = crew_directors[two] + "," + nconst.to_numpy()[second[two]]
+    crew_directors[rng.random(titles) < 0.05] = "\\N"
+    crew = pd.DataFrame(
+        {"tconst": tconst, "directors": crew_directors, "writers": "\\N"}
+    )
+
+    rated = rng.random(titles) < 0.8
+    averages = np.clip(rng.normal(6.2, 1.2, rated.sum()), 1, 10).round(1)
+    votes = (rng.lognormal(3, 1.8, rated.sum()) + 5).astype(np.int64)
+    ratings = pd.DataFrame(
+        {"tconst": tconst[rated], "averageRating": averages, "numVotes": votes}
+    )
+
+    full_names = (
+        _FIRST_NAMES[rng.integers(0, len(_FIRST_NAMES), people)].astype(object)
+        + " "
+        + _LAST_NAMES[rng.integers(0, len(_LAST_NAMES), people)]
+    )
+    name_basics = pd.DataFrame(
+        {
+            "nconst": nconst,
+            "primaryName": full_names,
+            "birthYear": "\\N",
+            "deathYear": "\\N",
+            "primaryProfession": "\\N",
+            "knownForTitles": "\\N",
+        }
+    )
+
+    credits = rng.integers(2, 11, titles)
+    owner = np.repeat(np.arange(titles), credits)
+    ordering = np.arange(len(owner)) - np.repeat(np.cumsum(credits) - credits, credits)
+    category = rng.choice(
+        np.array(["actor", "actress", "crew"]), len(owner), p=[0.45, 0.35, 0.2]
+    ).astype(object)
+    is_crew = category == "crew"
+    category[is_crew] = rng.choice(_CREW_CATEGORIES, is_crew.sum())
+    person = directors + _popular(rng, people - directors, len(owner))
+    principals = pd.DataFrame(
+        {
+            "tconst": tconst.to_numpy()[owner],
+            "ordering": ordering + 1,
+            "nconst": nconst.to_numpy()[person],
+            "category": category,
+            "job": "\\N",
+            "characters": "\\N",
+        }
+    )
+
+    paths = {}
+    for name, frame in (
+        (TITLE_BASICS, basics),
+        (TITLE_CREW, crew),
+        (TITLE_RATINGS, ratings),
+        (NAME_BASICS, name_basics),
+        (TITLE_PRINCIPALS, principals),
+    ):
+        paths[name] = directory / name
+        frame.to_csv(paths[name], sep="\t", index=False)
+    return paths
+
+
+def make_reduced_dataset(movies: int, seed: int = 0) -> pd.DataFrame:
+    """Return a frame shaped like the output of :class:`MovieDatasetReducer`.
+
+    Movies are ordered by descending score and have one director, one to
+    three genres and three to six actors drawn with a popularity skew.
+    """
+    rng = np.random.default_rng(seed)
+    people = max(10, movies)
+    full_names = (
+        _FIRST_NAMES[rng.integers(0, len(_FIRST_NAMES), people)].astype(object)
+        + " "
+        + _LAST_NAMES[rng.integers(0, len(_LAST_NAMES), people)]
+    )
+    cast_sizes = rng.integers(3, 7, movies)
+    cast = full_names[_popular(rng, people, cast_sizes.sum())]
+    bounds = np.cumsum(cast_sizes) - cast_sizes
+    genres = _genres(rng, movies)
+    genres[genres == "\\N"] = "Drama"
+    return pd.DataFrame(
+        {
+            "tconst": _ids("tt", movies),
+            "title": _titles(rng, movies),
+            "year": rng.integers(1920, 2025, movies),
+            "director": full_names[_popular(rng, people // 10 or 1, movies)],
+            "genres": [value.split(",") for value in genres],
+            "score": np.sort(rng.normal(6.5, 0.8, movies))[::-1],
+            "actors": [
+                list(cast[start : start + size])
+                for start, size in zip(bounds, cast_sizes)
+            ],
+        }
+    )
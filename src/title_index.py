@@ -0,0 +1,236 @@
+"""Case-insensitive prefix and fuzzy lookup of movie titles."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .neighbors import top_k_indices
+
+_NON_WORD = re.compile(r"[\W_]+")
+# "Heat (1995)" as shown by :meth:`TitleIndex.label`.
+_YEAR_SUFFIX = re.compile(r"^(.*\S)\s*\((\d{4})\)$")
+# Sorts after every character, so ``key + _LAST`` bounds the keys starting with
+# ``key``.
+_LAST = "\U0010ffff"
+
+
+def normalize_title(title: str) -> str:
+    """Lower-case ``title`` and drop accents, punctuation and repeated spaces."""
+    text = unicodedata.normalize("NFKD", str(title)).casefold()
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def split_year(title: str) -> tuple[str, int | None]:
+    """Split a trailing ``"(1995)"`` off ``title``; the year is ``None`` if absent."""
+    match = _YEAR_SUFFIX.match(title.strip())
+    if match is None:
+        return title, None
+    return match.group(1), int(match.group(2))
+
+
+def _smallest(values: np.ndarray, k: int) -> np.ndarray:
+    """Return the ``k`` smallest ``values`` in ascending order."""
+    if len(values) > k > 0:
+        values = np.partition(values, k - 1)[:k]
+    return np.sort(values)[:k]
+
+
+class TitleIndex:
+    """Look up catalog rows by exact, prefix or misspelled title.
+
+    Rows are positions in ``titles``, which is expected to be ordered from
+    most to least popular; ties between equally good matches keep that order.
+    Titles are compared after :func:`normalize_title`.
+
+    Parameters
+    ----------
+    titles:
+        Title of every row.
+    years:
+        Optional release year of every row, ``NaN`` when unknown. Used to tell
+        movies sharing a title apart.
+    ids:
+        Optional IMDb ``tconst`` of every row.
+    """
+
+    def __init__(
+        self,
+        titles: Sequence[str],
+        years: Sequence[float] | None = None,
+        ids: Sequence[str] | None = None,
+    ) -> None:
+        self.titles = np.asarray(titles, dtype=object)
+        self.years = None if years is None else np.asarray(years, dtype=float)
+        self.ids = None if ids is None else np.asarray(ids, dtype=object)
+        keys = [normalize_title(title) for title in self.titles]
+
+        self._exact = {}
+        for row, key in enumerate(keys):
+            self._exact.setdefault(key, []).append(row)
+
+        # Every word start is indexed, so "knight" finds "The Dark Knight".
+        suffixes, rows, inner = [], [], []
+        for row, key in enumerate(keys):
+            starts = [0] + [match.end() for match in re.finditer(" ", key)]
+            for start in starts:
+                suffixes.append(key[start:])
+                rows.append(row)
+                inner.append(start > 0)
+        order = sorted(range(len(suffixes)), key=suffixes.__getitem__)
+        self._suffixes = [suffixes[i] for i in order]
+        self._suffix_rows = np.asarray(rows, dtype=np.int64)[order]
+        self._suffix_inner = np.asarray(inner, dtype=bool)[order]
+
+        self._vectorizer = CountVectorizer(
+            analyzer="char_wb", ngram_range=(3, 3), binary=True
+        )
+        grams = self._vectorizer.fit_transform(keys)
+        self._gram_counts = np.asarray(grams.sum(axis=1)).ravel()
+        # Trigram-major copy so a query only touches the postings of its grams.
+        self._postings = grams.T.tocsr()
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def extend(
+        self,
+        titles: Sequence[str],
+        years: Sequence[float] | None = None,
+        ids: Sequence[str] | None = None,
+    ) -> None:
+        """Index more rows after the existing ones.
+
+        Trigrams that only occur in the new titles are not indexed, so fuzzy
+        matches of those titles are a little less precise until the index is
+        rebuilt.
+        """
+        start = len(self.titles)
+        titles = np.asarray(titles, dtype=object)
+        self.titles = np.concatenate([self.titles, titles])
+        if self.years is not None:
+            years = np.full(len(titles), np.nan) if years is None else years
+            self.years = np.concatenate([self.years, np.asarray(years, dtype=float)])
+        if self.ids is not None:
+            ids = np.full(len(titles), None) if ids is None else ids
+            self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=object)])
+        keys = [normalize_title(title) for title in titles]
+
+        for row, key in enumerate(keys, start):
+            self._exact.setdefault(key, []).append(row)
+
+        suffixes, rows, inner = [], [], []
+        for row, key in enumerate(keys, start):
+            starts = [0] + [match.end() for match in re.finditer(" ", key)]
+            for position in starts:
+                suffixes.append(key[position:])
+                rows.append(row)
+                inner.append(position > 0)
+        order = sorted(range(len(suffixes)), key=suffixes.__getitem__)
+        suffixes = [suffixes[i] for i in order]
+        # Equal suffixes keep row order, so new rows go after existing ones.
+        positions = [bisect_right(self._suffixes, suffix) for suffix in suffixes]
+        merged = np.insert(
+            np.asarray(self._suffixes, dtype=object), positions, suffixes
+        )
+        self._suffixes = merged.tolist()
+        self._suffix_rows = np.insert(
+            self._suffix_rows, positions, np.asarray(rows, dtype=np.int64)[order]
+        )
+        self._suffix_inner = np.insert(
+            self._suffix_inner, positions, np.asarray(inner, dtype=bool)[order]
+        )
+
+        analyzer = self._vectorizer.build_analyzer()
+        counts = [len(set(analyzer(key))) for key in keys]
+        self._gram_counts = np.concatenate([self._gram_counts, counts])
+        grams = self._vectorizer.transform(keys)
+        self._postings = sparse.hstack([self._postings, grams.T], format="csr")
+
+    def lookup(
+        self, title: str, year: int | None = None, tconst: str | None = None
+    ) -> np.ndarray:
+        """Return the rows titled ``title``, best first.
+
+        ``tconst`` selects one movie directly. Otherwise ``year``, or a
+        trailing ``"(1995)"`` in ``title``, narrows movies sharing a title.
+        Rows whose title matches ``title`` verbatim come before rows that
+        only match once normalized.
+        """
+        if tconst is not None and self.ids is not None:
+            return np.flatnonzero(self.ids == tconst)
+        rows = self._exact.get(normalize_title(title))
+        if rows is None:
+            name, suffix = split_year(title)
+            if suffix is None or year is not None:
+                return np.empty(0, dtype=np.int64)
+            title, year = name, suffix
+            rows = self._exact.get(normalize_title(title), [])
+        rows = np.asarray(rows, dtype=np.int64)
+        if year is not None and self.years is not None:
+            rows = rows[self.years[rows] == year]
+        verbatim = self.titles[rows] == title
+        return np.concatenate([rows[verbatim], rows[~verbatim]])
+
+    def prefix(self, query: str, limit: int = 10) -> np.ndarray:
+        """Return up to ``limit`` rows with a word starting with ``query``.
+
+        Titles that start with ``query`` rank before titles where it only
+        starts a later word.
+        """
+        key = normalize_title(query)
+        if not key:
+            return np.empty(0, dtype=np.int64)
+        lo = bisect_left(self._suffixes, key)
+        hi = bisect_left(self._suffixes, key + _LAST, lo)
+        rows = self._suffix_rows[lo:hi]
+        inner = self._suffix_inner[lo:hi]
+        found = _smallest(rows[~inner], limit)
+        if len(found) < limit:
+            later = np.unique(rows[inner])
+            later = later[~np.isin(later, found)]
+            found = np.concatenate([found, later[: limit - len(found)]])
+        return found
+
+    def fuzzy(
+        self, query: str, limit: int = 10, min_similarity: float = 0.3
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, similarities)`` of titles resembling ``query``.
+
+        Titles are scored by the Jaccard similarity of their character
+        trigrams, which tolerates typos and missing words.
+        """
+        grams = self._vectorizer.transform([normalize_title(query)])
+        if grams.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        shared = (grams @ self._postings).tocsr()
+        rows = shared.indices
+        similarity = shared.data / (grams.nnz + self._gram_counts[rows] - shared.data)
+        # Rows are visited in catalog order so ties keep the popular movie first.
+        order = np.argsort(rows, kind="stable")
+        rows, similarity = rows[order], similarity[order]
+        top = top_k_indices(similarity, limit)[0]
+        top = top[similarity[top] >= min_similarity]
+        return rows[top], similarity[top]
+
+    def search(self, query: str, limit: int = 10) -> np.ndarray:
+        """Return prefix matches of ``query`` topped up with fuzzy matches."""
+        rows = self.prefix(query, limit)
+        if len(rows) < limit:
+            similar, _ = self.fuzzy(query, limit)
+            rows = np.concatenate([rows, similar[~np.isin(similar, rows)]])
+        return rows[:limit]
+
+    def label(self, row: int) -> str:
+        """Return the title of ``row`` with its year, e.g. ``"Heat (1995)"``."""
+        title = self.titles[row]
+        if self.years is None or np.isnan(self.years[row]):
+            return title
+        return f"{title} ({int(self.years[row])})"
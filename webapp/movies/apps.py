@@ -1,6 +1,49 @@
+import logging
+import os
+import sys
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _is_runserver() -> bool:
+    """Whether this process serves requests for ``manage.py runserver``."""
+    if Path(sys.argv[0]).name != "manage.py" or sys.argv[1:2] != ["runserver"]:
+        return False
+    # The autoreloader serves from a child process marked with RUN_MAIN.
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
+def warm_up() -> None:
+    """Build the recommender and its title index before the first request.
+
+    The WSGI and ASGI entry points call this once the application is loaded,
+    and :meth:`MoviesConfig.ready` does for ``runserver``. Management
+    commands, tests and scripts calling ``django.setup()`` never build the
+    model.
+    """
+    if settings.RECOMMENDER_BACKEND == "database" or not settings.RECOMMENDER_WARMUP:
+        return
+    from .views import get_recommender
+
+    try:
+        get_recommender()
+    except ValueError as exc:
+        logger.warning("Skipping recommender warm-up: %s", exc)
 
 
 class MoviesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "movies"
+
+    def ready(self) -> None:
+        """Enable metrics and warm up the development server."""
+        if settings.RECOMMENDER_METRICS:
+            from src import instrumentation
+
+            instrumentation.enable()
+        if _is_runserver():
+            warm_up()
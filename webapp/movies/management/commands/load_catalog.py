@@ -0,0 +1,109 @@
+"""Copy the reduced dataset and its top-k neighbors into the database."""
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movies.models import Movie, Neighbor
+from src.movie_recommender import MovieRecommender
+from src.title_index import normalize_title
+
+
+def _neighbor_rows(
+    indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray, top_k: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the ``(movie, neighbor, rank, score)`` columns to store.
+
+    Each movie keeps its ``top_k`` best neighbors other than itself.
+    """
+    owners = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    keep = indices != owners
+    owners, indices, scores = owners[keep], indices[keep], scores[keep]
+    starts = np.searchsorted(owners, np.arange(len(indptr) - 1))
+    ranks = np.arange(len(owners)) - starts[owners]
+    keep = ranks < top_k
+    return owners[keep], indices[keep], ranks[keep], scores[keep]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the reduced dataset and the top-k neighbors of every movie into "
+        "the database, replacing what was loaded before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset",
+            default=settings.RECOMMENDER_DATASET_PATH,
+            help="Reduced dataset to load (default: RECOMMENDER_DATASET_PATH)",
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=settings.RECOMMENDER_TOP_K,
+            help="Neighbors stored per movie (default: RECOMMENDER_TOP_K)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows inserted per statement (default: 5000)",
+        )
+
+    def handle(self, *args, **options):
+        top_k = options["top_k"]
+        batch_size = options["batch_size"]
+        if top_k < 1 or batch_size < 1:
+            raise CommandError("--top-k and --batch-size must be positive.")
+        recommender = MovieRecommender(similarity="topk", top_k=top_k)
+        try:
+            recommender.load_dataset(options["dataset"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not load {options['dataset']}: {exc}")
+        df = recommender.df
+        titles = df["title"].astype(str).tolist()
+        tconsts = df["tconst"].tolist() if "tconst" in df else [None] * len(df)
+        years = df["year"].tolist() if "year" in df else [None] * len(df)
+        scores = df["score"].astype(float).tolist()
+        movie, neighbor, rank, score = _neighbor_rows(
+            recommender.neighbors.indptr,
+            recommender.neighbors.indices,
+            recommender.neighbors.scores,
+            top_k,
+        )
+
+        with transaction.atomic():
+            Neighbor.objects.all().delete()
+            Movie.objects.all().delete()
+            # Primary keys are the dataset rows plus one, so neighbors can
+            # refer to movies without reading them back.
+            for start in range(0, len(df), batch_size):
+                stop = min(start + batch_size, len(df))
+                Movie.objects.bulk_create(
+                    Movie(
+                        pk=row + 1,
+                        row=row,
+                        tconst=None if pd.isna(tconsts[row]) else str(tconsts[row]),
+                        title=titles[row],
+                        normalized_title=normalize_title(titles[row]),
+                        year=None if pd.isna(years[row]) else int(years[row]),
+                        score=scores[row],
+                    )
+                    for row in range(start, stop)
+                )
+            for start in range(0, len(movie), batch_size):
+                stop = min(start + batch_size, len(movie))
+                Neighbor.objects.bulk_create(
+                    Neighbor(
+                        movie_id=int(movie[position]) + 1,
+                        neighbor_id=int(neighbor[position]) + 1,
+                        rank=int(rank[position]),
+                        score=float(score[position]),
+                    )
+                    for position in range(start, stop)
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f"Loaded {len(df)} movies and {len(movie)} neighbors.")
+        )
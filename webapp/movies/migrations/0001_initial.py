@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Movie",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("row", models.PositiveIntegerField(unique=True)),
+                (
+                    "tconst",
+                    models.CharField(blank=True, max_length=16, null=True, unique=True),
+                ),
+                ("title", models.CharField(max_length=512)),
+                ("normalized_title", models.CharField(db_index=True, max_length=512)),
+                ("year", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("score", models.FloatField()),
+            ],
+            options={
+                "ordering": ["row"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Neighbor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+                (
+                    "neighbor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["movie", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("movie", "rank"), name="unique_neighbor_rank"
+                    )
+                ],
+            },
+        ),
+    ]
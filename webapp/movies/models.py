@@ -1,3 +1,116 @@
+"""Database copy of the reduced dataset and its precomputed neighbors."""
+
 from django.db import models
+from django.db.models import Case, Q, Subquery, Sum, Value, When
+
+from src.title_index import normalize_title, split_year
+
+
+class MovieQuerySet(models.QuerySet):
+    def titled(self, title: str) -> "MovieQuerySet":
+        """Return the movies matching ``title``, best first.
+
+        Titles match like :meth:`TitleIndex.lookup`: once normalized, and
+        with a trailing ``"(1995)"`` narrowing movies that share a title.
+        Exact matches come first, then the most popular movies.
+        """
+        normalized = normalize_title(title)
+        matches = Q(normalized_title=normalized)
+        name, year = split_year(title)
+        if year is not None:
+            matches |= Q(normalized_title=normalize_title(name), year=year)
+        exact = Case(When(normalized_title=normalized, then=Value(0)), default=1)
+        return self.filter(matches).order_by(exact, "row")
+
+    def suggest(self, query: str) -> "MovieQuerySet":
+        """Return the movies whose title starts with ``query``, most popular first.
+
+        The prefix is compared after :func:`normalize_title`, so the lookup
+        can use the index on ``normalized_title``.
+        """
+        prefix = normalize_title(query)
+        if not prefix:
+            return self.none()
+        return self.filter(normalized_title__startswith=prefix).order_by("row")
+
+
+class Movie(models.Model):
+    """A movie of the reduced dataset, as far as serving recommendations needs."""
+
+    # Position in the dataset, which is sorted by descending score.
+    row = models.PositiveIntegerField(unique=True)
+    tconst = models.CharField(max_length=16, unique=True, null=True, blank=True)
+    title = models.CharField(max_length=512)
+    normalized_title = models.CharField(max_length=512, db_index=True)
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+    score = models.FloatField()
+
+    objects = MovieQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["row"]
+
+    def __str__(self) -> str:
+        return self.title if self.year is None else f"{self.title} ({self.year})"
+
+
+def _resolve(title: str) -> int:
+    """Return the primary key of the movie ``title`` or raise ValueError."""
+    pk = Movie.objects.titled(title).values_list("pk", flat=True).first()
+    if pk is None:
+        raise ValueError("This movie is not in the dataset.")
+    return pk
+
+
+class NeighborQuerySet(models.QuerySet):
+    def recommend(self, titles: list[str], top_n: int = 10) -> list[str]:
+        """Return the titles of the ``top_n`` movies closest to ``titles``.
+
+        A single title is answered with one query over the ``(movie, rank)``
+        index. Several titles add up the stored neighbor scores of every
+        seed, so only movies among some seed's neighbors can be returned.
+        """
+        if len(titles) == 1:
+            seed = Movie.objects.titled(titles[0]).values("pk")[:1]
+            found = list(
+                self.filter(movie=Subquery(seed))
+                .order_by("rank")
+                .values_list("neighbor__title", flat=True)[:top_n]
+            )
+            if not found:
+                # Tell a missing title apart from a movie without neighbors.
+                _resolve(titles[0])
+            return found
+
+        seeds = {_resolve(title) for title in titles}
+        return list(
+            self.filter(movie__in=seeds)
+            .exclude(neighbor__in=seeds)
+            .values("neighbor", "neighbor__title")
+            .annotate(total=Sum("score"))
+            .order_by("-total", "neighbor__row")
+            .values_list("neighbor__title", flat=True)[:top_n]
+        )
+
+
+class Neighbor(models.Model):
+    """One of the ``top_k`` most similar movies of ``movie``."""
+
+    # The unique (movie, rank) constraint already indexes ``movie``.
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="+")
+    # 0 for the most similar movie.
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    objects = NeighborQuerySet.as_manager()
 
-# Create your models here.
+    class Meta:
+        ordering = ["movie", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["movie", "rank"], name="unique_neighbor_rank"
+            )
+        ]
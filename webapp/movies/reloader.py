@@ -0,0 +1,102 @@
+"""Keep the served recommender in step with its dataset file."""
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from src.movie_recommender import MovieRecommender
+
+logger = logging.getLogger(__name__)
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    """Return the size and modification time of ``path``, if it exists."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ReloadingRecommender:
+    """Serve a recommender and rebuild it in the background when needed.
+
+    The recommender is built when the object is created. Afterwards the
+    dataset is checked at most every ``interval`` seconds; when its size or
+    modification time changed, a daemon thread builds a new recommender while
+    the old one keeps serving, and the new one replaces it in a single
+    assignment once it is ready. A failed rebuild is logged and retried on a
+    later check.
+
+    Parameters
+    ----------
+    dataset:
+        Dataset file to watch.
+    build:
+        Callable returning a freshly loaded :class:`MovieRecommender`.
+    interval:
+        Minimum seconds between checks, or ``None`` to never reload.
+    """
+
+    def __init__(
+        self,
+        dataset: str | Path,
+        build: Callable[[], MovieRecommender],
+        interval: float | None = 2.0,
+    ) -> None:
+        self.dataset = Path(dataset)
+        self.interval = interval
+        self._build = build
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stamp = _stamp(self.dataset)
+        self._recommender = build()
+        self._checked = time.monotonic()
+
+    @property
+    def recommender(self) -> MovieRecommender:
+        """The current recommender; may start a background reload."""
+        self._check()
+        return self._recommender
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Block until a running reload has finished."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _check(self) -> None:
+        if self.interval is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.interval:
+            return
+        self._checked = now
+        stamp = _stamp(self.dataset)
+        if stamp is None or stamp == self._stamp:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._reload,
+                args=(stamp,),
+                name="recommender-reload",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _reload(self, stamp: tuple[int, int]) -> None:
+        logger.info("Dataset %s changed, rebuilding recommender.", self.dataset)
+        try:
+            recommender = self._build()
+        except Exception:
+            logger.exception(
+                "Could not reload %s, keeping the old model.", self.dataset
+            )
+            return
+        self._recommender = recommender
+        self._stamp = stamp
+        logger.info("Recommender reloaded from %s.", self.dataset)
@@ -1,14 +1,169 @@
 """Unit tests for the movie recommendation utilities."""
 
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import gzip
+import json
 import os
 import tempfile
+import time
 import unittest
+import unittest.mock
 
+import numpy as np
 import pandas as pd
 
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src import instrumentation
+from src.ann_index import recall_report
+from src.columnar import read_columnar
 from src.dataset_reducer import MovieDatasetReducer
 from src.movie_recommender import MovieRecommender
+from src.neighbors import NeighborTable, top_k_indices
+from src.result_cache import ResultCache
+from src.synthetic import make_reduced_dataset, write_synthetic_dumps
+from src.title_index import TitleIndex
+
+
+def make_movies(count: int, seed: int = 0) -> pd.DataFrame:
+    """Return a reduced dataset frame with overlapping casts and genres."""
+    rng = np.random.default_rng(seed)
+    actors = [f"Actor {i}" for i in range(count // 2 + 3)]
+    directors = [f"Director {i}" for i in range(count // 4 + 2)]
+    genres = ["Action", "Drama", "Comedy", "Thriller", "Horror", "Romance"]
+    return pd.DataFrame(
+        {
+            "title": [f"Movie {i}" for i in range(count)],
+            "director": rng.choice(directors, count),
+            "genres": [
+                str(list(rng.choice(genres, 2, replace=False))) for _ in range(count)
+            ],
+            "score": rng.uniform(5, 9, count).round(3),
+            "actors": [
+                str(list(rng.choice(actors, 3, replace=False))) for _ in range(count)
+            ],
+        }
+    )
+
+
+def make_large_movies(count: int, seed: int = 0) -> pd.DataFrame:
+    """Vectorized variant of :func:`make_movies` for large synthetic datasets."""
+    rng = np.random.default_rng(seed)
+    ids = pd.DataFrame(rng.integers(0, count // 3 + 1, size=(count, 3))).astype(str)
+    genres = np.array(["Action", "Drama", "Comedy", "Sci-Fi", "Film-Noir"])
+    picked = pd.DataFrame(genres[rng.integers(0, len(genres), size=(count, 2))])
+    return pd.DataFrame(
+        {
+            "title": "Movie " + pd.Series(np.arange(count)).astype(str),
+            "director": "Director " + ids[0],
+            "genres": "['" + picked[0] + "', '" + picked[1] + "']",
+            "score": rng.uniform(5, 9, count).round(3),
+            "actors": "['Actor " + ids[1] + "', 'Actor " + ids[2] + "']",
+        }
+    )
+
+
+def write_imdb_dumps(directory: str | Path) -> None:
+    """Write a tiny set of raw IMDb TSV dumps to ``directory``."""
+    directory = Path(directory)
+    movies = [
+        ("tt0000001", "movie", "Alpha", "Action,Drama", 8.1, 900, "nm0000001"),
+        ("tt0000002", "movie", "Beta", "Comedy", 6.5, 120, "nm0000002"),
+        ("tt0000003", "movie", "Gamma", "Action", 7.4, 450, "nm0000001,nm0000002"),
+        ("tt0000004", "movie", "Delta", "Horror", 5.2, 40, "nm0000003"),
+        ("tt0000005", "tvSeries", "Epsilon", "Drama", 9.0, 5000, "nm0000003"),
+        ("tt0000006", "movie", "Zeta", "Drama,Romance", 7.9, 300, "\\N"),
+        ("tt0000007", "movie", "Eta", "Thriller", 6.9, 2000, "nm0000002"),
+    ]
+    pd.DataFrame(
+        {
+            "tconst": [m[0] for m in movies],
+            "titleType": [m[1] for m in movies],
+            "primaryTitle": [m[2] for m in movies],
+            "originalTitle": [m[2] for m in movies],
+            "startYear": [2000 + i for i in range(len(movies))],
+            "genres": [m[3] for m in movies],
+        }
+    ).to_csv(directory / "title.basics.tsv", sep="\t", index=False)
+    pd.DataFrame(
+        {
+            "tconst": [m[0] for m in movies],
+            "averageRating": [m[4] for m in movies],
+            "numVotes": [m[5] for m in movies],
+        }
+    ).to_csv(directory / "title.ratings.tsv", sep="\t", index=False)
+    pd.DataFrame(
+        {
+            "tconst": [m[0] for m in movies],
+            "directors": [m[6] for m in movies],
+            "writers": ["\\N"] * len(movies),
+        }
+    ).to_csv(directory / "title.crew.tsv", sep="\t", index=False)
+    pd.DataFrame(
+        {
+            "nconst": [f"nm{i:07d}" for i in range(1, 9)],
+            "primaryName": [
+                "Director One",
+                "Director Two",
+                "Director Three",
+                "Actor Four",
+                "Actor Five",
+                "Actor Six",
+                "Actress Seven",
+                "Actor Eight",
+            ],
+        }
+    ).to_csv(directory / "name.basics.tsv", sep="\t", index=False)
+    cast = [
+        ("tt0000001", "nm0000004", "actor"),
+        ("tt0000001", "nm0000005", "actor"),
+        ("tt0000001", "nm0000007", "actress"),
+        ("tt0000002", "nm0000005", "actor"),
+        ("tt0000003", "nm0000004", "actor"),
+        ("tt0000003", "nm0000006", "actor"),
+        ("tt0000003", "nm0000001", "director"),
+        ("tt0000004", "nm0000008", "actor"),
+        ("tt0000005", "nm0000006", "actor"),
+        ("tt0000007", "nm0000006", "actor"),
+        ("tt0000007", "nm0000008", "actor"),
+    ]
+    pd.DataFrame(
+        {
+            "tconst": [c[0] for c in cast],
+            "ordering": range(1, len(cast) + 1),
+            "nconst": [c[1] for c in cast],
+            "category": [c[2] for c in cast],
+        }
+    ).to_csv(directory / "title.principals.tsv", sep="\t", index=False)
+
+
+def load_shared_model(dataset: str, model_path: str, log_path: str) -> bool:
+    """Call ``load_or_build`` in a worker, logging every dataset build."""
+    load_dataset = MovieRecommender.load_dataset
+
+    def logged(self, path):
+        with open(log_path, "a") as log:
+            log.write(f"{os.getpid()}\n")
+        return load_dataset(self, path)
+
+    with unittest.mock.patch.object(MovieRecommender, "load_dataset", logged):
+        recommender = MovieRecommender.load_or_build(dataset, model_path)
+    return isinstance(recommender.cosine_sim, np.memmap)
+
+
+class working_directory:
+    """Temporarily change the current working directory."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = path
+
+    def __enter__(self) -> None:
+        self.previous = os.getcwd()
+        os.chdir(self.path)
+
+    def __exit__(self, *exc) -> None:
+        os.chdir(self.previous)
 
 
 class MovieUtilsTest(unittest.TestCase):
@@ -21,6 +176,243 @@ class MovieUtilsTest(unittest.TestCase):
         rating = reducer.weighted_rating(row, C=7.0, m=50)
         self.assertAlmostEqual(rating, 7.6667, places=4)
 
+    def test_weighted_ratings_matches_row_wise(self) -> None:
+        """The column-wise rating should equal the per-row wrapper."""
+        votes = pd.Series([10, 100, 1000])
+        ratings = pd.Series([5.0, 8.0, 6.5])
+        scores = MovieDatasetReducer.weighted_ratings(votes, ratings, C=7.0, m=50)
+        for v, r, score in zip(votes, ratings, scores):
+            row = {"numVotes": v, "averageRating": r}
+            self.assertAlmostEqual(
+                MovieDatasetReducer.weighted_rating(row, C=7.0, m=50), score
+            )
+
+    def test_reduce_datasets_matches_single_runs(self) -> None:
+        """Several quantiles in one pass should equal separate runs."""
+        reducer = MovieDatasetReducer()
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            combined = reducer.reduce_datasets([0.5, 0.0], ["half", "all"])
+            half = reducer.reduce_dataset(0.5, "half_single")
+            everything = reducer.reduce_dataset(0.0, "all_single")
+            self.assertTrue(Path("half.csv").exists())
+            self.assertTrue(Path("all.csv").exists())
+        pd.testing.assert_frame_equal(combined[0], half)
+        pd.testing.assert_frame_equal(combined[1], everything)
+        self.assertEqual(len(everything), 6)
+        zeta = everything.loc[everything["title"] == "Zeta"].iloc[0]
+        self.assertEqual(zeta["director"], "nan")
+        self.assertLess(len(half), len(everything))
+
+    def test_reduce_dataset_streams_small_chunks(self) -> None:
+        """Filtering chunk by chunk should not depend on the chunk size."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            streamed = MovieDatasetReducer(chunksize=2).reduce_dataset(0.2, "a")
+            whole = MovieDatasetReducer().reduce_dataset(0.2, "b")
+            self.assertEqual(Path("a.csv").read_text(), Path("b.csv").read_text())
+        pd.testing.assert_frame_equal(streamed, whole)
+        self.assertNotIn("Epsilon", streamed["title"].tolist())
+
+    def test_parallel_ingest_matches_sequential(self) -> None:
+        """Parsing byte ranges in worker processes should not change output."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            sequential = MovieDatasetReducer().reduce_dataset(0.2, "sequential")
+            with unittest.mock.patch("src.dataset_reducer.PARALLEL_BLOCK_BYTES", 40):
+                parallel = MovieDatasetReducer(workers=2).reduce_dataset(
+                    0.2, "parallel"
+                )
+            self.assertEqual(
+                Path("sequential.csv").read_text(), Path("parallel.csv").read_text()
+            )
+        pd.testing.assert_frame_equal(parallel, sequential)
+
+    def test_reduce_gzipped_dumps_from_input_dir(self) -> None:
+        """Gzipped dumps in another directory should reduce like plain ones."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            plain = MovieDatasetReducer().reduce_dataset(0.2, "plain")
+            os.mkdir("dumps")
+            for path in Path(tmpdir).glob("*.tsv"):
+                with gzip.open(Path("dumps") / f"{path.name}.gz", "wb") as handle:
+                    handle.write(path.read_bytes())
+                path.unlink()
+            with unittest.mock.patch("src.dataset_reducer.DECOMPRESS_BLOCK_BYTES", 16):
+                compressed = MovieDatasetReducer(
+                    chunksize=2, workers=2, input_dir="dumps"
+                ).reduce_dataset(0.2, "compressed")
+        pd.testing.assert_frame_equal(compressed, plain)
+
+    def test_update_dataset_matches_full_run(self) -> None:
+        """Incremental refreshes should equal reducing the new dumps."""
+        reducer = MovieDatasetReducer()
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            reducer.update_dataset(0.2, "movies", "state.npz")
+            self.assertTrue(Path("state.npz").exists())
+
+            ratings = pd.read_csv("title.ratings.tsv", sep="\t")
+            ratings.loc[ratings["tconst"] == "tt0000004", "numVotes"] = 3000
+            ratings.to_csv("title.ratings.tsv", sep="\t", index=False)
+            crew = pd.read_csv("title.crew.tsv", sep="\t")
+            crew.loc[crew["tconst"] == "tt0000002", "directors"] = "nm0000003"
+            crew.to_csv("title.crew.tsv", sep="\t", index=False)
+            cast = pd.read_csv("title.principals.tsv", sep="\t")
+            cast.loc[len(cast)] = ["tt0000007", 99, "nm0000004", "actor"]
+            cast.to_csv("title.principals.tsv", sep="\t", index=False)
+
+            updated = reducer.update_dataset(0.2, "movies", "state.npz")
+            full = reducer.reduce_dataset(0.2, "full")
+            self.assertEqual(
+                Path("movies.csv").read_text(), Path("full.csv").read_text()
+            )
+
+            ratings.loc[ratings["tconst"] == "tt0000001", "averageRating"] = 6.0
+            ratings.to_csv("title.ratings.tsv", sep="\t", index=False)
+            # Downloading the same dumps again only changes their mtime.
+            for path in Path(".").glob("*.tsv"):
+                os.utime(path, ns=(0, 0))
+            with unittest.mock.patch.object(
+                reducer, "_read_filtered", wraps=reducer._read_filtered
+            ) as read:
+                reducer.update_dataset(0.2, "movies", "state.npz")
+            reducer.reduce_dataset(0.2, "full")
+            self.assertEqual(
+                Path("movies.csv").read_text(), Path("full.csv").read_text()
+            )
+        pd.testing.assert_frame_equal(updated, full)
+        self.assertIn("Delta", updated["title"].tolist())
+        read.assert_not_called()
+
+    def test_update_dataset_applies_renames(self) -> None:
+        """Renamed people should be renamed in movies that did not change."""
+        reducer = MovieDatasetReducer()
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            reducer.update_dataset(0.2, "movies", "state.npz")
+            names = Path("name.basics.tsv")
+            names.write_text(
+                names.read_text()
+                .replace("Director One", "Director Renamed")
+                .replace("Actor Six", "Actor Renamed")
+            )
+            with unittest.mock.patch.object(
+                reducer, "_attach_names", wraps=reducer._attach_names
+            ) as attach:
+                updated = reducer.update_dataset(0.2, "movies", "state.npz")
+            full = reducer.reduce_dataset(0.2, "full")
+            self.assertEqual(
+                Path("movies.csv").read_text(), Path("full.csv").read_text()
+            )
+            with unittest.mock.patch("hashlib.sha256") as sha256:
+                reducer.update_dataset(0.2, "movies", "state.npz")
+        # Only the movies crediting a renamed person are joined again.
+        self.assertEqual(sorted(attach.call_args.args[0]["tconst"]), [1, 3, 7])
+        sha256.assert_not_called()
+        pd.testing.assert_frame_equal(updated, full)
+        self.assertIn("Director Renamed", updated["director"].tolist())
+        self.assertIn("Actor Renamed", updated["actors"].sum())
+
+    def test_reduce_dataset_handles_long_ids(self) -> None:
+        """Ids past seven digits should join and keep the first director."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            for name in ["basics", "ratings", "crew", "principals"]:
+                path = Path(f"title.{name}.tsv")
+                path.write_text(path.read_text().replace("tt0000007", "tt12345678"))
+            crew = pd.read_csv("title.crew.tsv", sep="\t")
+            crew.loc[crew["tconst"] == "tt12345678", "directors"] = (
+                "nm12345678,nm0000001"
+            )
+            crew.to_csv("title.crew.tsv", sep="\t", index=False)
+            with open("name.basics.tsv", "a") as names:
+                names.write("nm12345678\tDirector Long\n")
+            reduced = MovieDatasetReducer().reduce_dataset(0.0, "movies")
+        movie = reduced.loc[reduced["title"] == "Eta"].iloc[0]
+        self.assertEqual(movie["tconst"], "tt12345678")
+        self.assertEqual(movie["director"], "Director Long")
+        self.assertEqual(movie["actors"], ["Actor Six", "Actor Eight"])
+
+    def test_synthetic_dumps_reduce_and_load(self) -> None:
+        """Synthetic dumps and datasets should run through the whole pipeline."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            paths = write_synthetic_dumps(tmpdir, 500, seed=1)
+            reduced = MovieDatasetReducer().reduce_dataset(0.5, "movies")
+            make_reduced_dataset(300, seed=1).to_csv("synthetic.csv")
+            rec = MovieRecommender(similarity="query")
+            rec.load_dataset("synthetic.csv")
+        self.assertEqual(len(paths), 5)
+        self.assertGreater(len(reduced), 50)
+        self.assertLess(len(reduced), 500)
+        self.assertEqual(len(rec.df), 300)
+        self.assertEqual(len(rec.recommend(rec.df["title"][0], 5)), 5)
+
+    def test_columnar_dataset_round_trip(self) -> None:
+        """The npz output should keep lists and load like the CSV output."""
+        with tempfile.TemporaryDirectory() as tmpdir, working_directory(tmpdir):
+            write_imdb_dumps(tmpdir)
+            MovieDatasetReducer().reduce_dataset(0.0, "movies")
+            reduced = MovieDatasetReducer(output_format="npz").reduce_dataset(
+                0.0, "movies"
+            )
+            stored = read_columnar("movies.npz")
+            from_csv = MovieRecommender()
+            from_csv.load_dataset("movies.csv")
+            from_npz = MovieRecommender()
+            from_npz.load_dataset("movies.npz")
+        self.assertEqual(stored["actors"].tolist(), reduced["actors"].tolist())
+        self.assertEqual(stored["genres"][0], ["Action", "Drama"])
+        self.assertEqual(stored["score"].dtype, np.float64)
+        self.assertEqual(str(stored["year"].dtype), "Int64")
+        self.assertEqual(stored["tconst"][0], "tt0000001")
+        self.assertEqual(
+            from_csv.vectorizer.vocabulary_, from_npz.vectorizer.vocabulary_
+        )
+        self.assertEqual((from_csv.features != from_npz.features).nnz, 0)
+        self.assertEqual(
+            from_npz.recommend("Alpha", 3).tolist(),
+            from_csv.recommend("Alpha", 3).tolist(),
+        )
+
+    def test_title_index_lookup(self) -> None:
+        """Titles should be found by prefix, typo, year and tconst."""
+        index = TitleIndex(
+            ["Heat", "The Dark Knight", "Heat", "Amélie", "Dark City"],
+            [1995, 2008, 1986, 2001, 1998],
+            ["tt1", "tt2", "tt3", "tt4", "tt5"],
+        )
+        self.assertEqual(index.lookup("heat").tolist(), [0, 2])
+        self.assertEqual(index.lookup("Heat (1986)").tolist(), [2])
+        self.assertEqual(index.lookup("Heat", year=1986).tolist(), [2])
+        self.assertEqual(index.lookup("Heat", tconst="tt3").tolist(), [2])
+        self.assertEqual(index.lookup("Heat (1970)").tolist(), [])
+        self.assertEqual(index.prefix("ame").tolist(), [3])
+        self.assertEqual(index.prefix("DARK").tolist(), [4, 1])
+        self.assertEqual(index.prefix("dark", limit=1).tolist(), [4])
+        rows, _ = index.fuzzy("dark knigth")
+        self.assertEqual(rows[0], 1)
+        self.assertEqual(index.search("dark k").tolist()[0], 1)
+        self.assertEqual(index.label(2), "Heat (1986)")
+
+    def test_recommend_suggests_similar_titles(self) -> None:
+        """Unknown titles should fail with suggestions, any case should match."""
+        df = make_movies(20, seed=5)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            rec = MovieRecommender()
+            rec.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        self.assertEqual(
+            rec.recommend("movie 3", 5).tolist(), rec.recommend("Movie 3", 5).tolist()
+        )
+        with self.assertRaisesRegex(ValueError, "Did you mean: Movie 3"):
+            rec.recommend("Movei 3")
+        matches = rec.find_titles("Movie 1", 3)
+        self.assertEqual(matches["title"].tolist(), ["Movie 1", "Movie 10", "Movie 11"])
+
     def test_clean_data_and_create_soup(self) -> None:
         """Verify cleaning helpers and soup creation."""
         rec = MovieRecommender()
@@ -61,6 +453,475 @@ class MovieUtilsTest(unittest.TestCase):
             os.unlink(tmp.name)
         self.assertEqual(result, ["Movie B", "Movie C"])
 
+    def test_top_k_indices_matches_stable_sort(self) -> None:
+        """Top-k selection should break ties by index like ``sorted``."""
+        scores = np.array([[0.5, 1.0, 0.5, 0.2, 1.0, 0.5], [0, 0, 0, 0, 0, 0]])
+        for k in range(1, 7):
+            expected = [
+                [i for i, _ in sorted(enumerate(row), key=lambda x: x[1], reverse=True)]
+                for row in scores.tolist()
+            ]
+            expected = [row[:k] for row in expected]
+            self.assertEqual(top_k_indices(scores, k).tolist(), expected)
+
+    def test_topk_mode_matches_dense(self) -> None:
+        """The sparse neighbor store should reproduce dense recommendations."""
+        df = make_movies(60)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            dense = MovieRecommender()
+            dense.load_dataset(tmp.name)
+            topk = MovieRecommender(similarity="topk", top_k=8, block_size=7)
+            topk.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        self.assertIsNone(topk.cosine_sim)
+        for title in df["title"]:
+            for top_n in (1, 5, 8):
+                self.assertEqual(
+                    topk.recommend(title, top_n).tolist(),
+                    dense.recommend(title, top_n).tolist(),
+                )
+        with self.assertRaises(ValueError):
+            topk.recommend("Movie 0", top_n=9)
+
+    def test_serve_from_precomputed_neighbor_table(self) -> None:
+        """A table built by a process pool should serve like the topk mode."""
+        df = make_movies(60, seed=5)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = Path(tmpdir) / "movies.csv"
+            df.to_csv(dataset, index=False)
+            topk = MovieRecommender(similarity="topk", top_k=8)
+            topk.load_dataset(dataset)
+            exporter = MovieRecommender()
+            features = exporter.load_features(dataset)
+            self.assertIsNone(exporter.cosine_sim)
+            self.assertIsNone(exporter._features_t)
+            self.assertEqual(exporter.dataset_hash, topk.dataset_hash)
+            table = NeighborTable.build(features, 9, block_size=7, workers=2)
+            np.testing.assert_array_equal(table.indices, topk.neighbors.indices)
+            np.testing.assert_array_equal(table.scores, topk.neighbors.scores)
+            table.save(
+                Path(tmpdir) / "neighbors", top_k=8, dataset_hash=topk.dataset_hash
+            )
+            # An interrupted save leaves the previous table in place.
+            with unittest.mock.patch(
+                "src.neighbors.np.save", side_effect=[None, OSError("disk full")]
+            ):
+                with self.assertRaises(OSError):
+                    table.save(Path(tmpdir) / "neighbors", top_k=8, dataset_hash="")
+            self.assertEqual(
+                sorted(os.listdir(tmpdir)), ["movies.csv", "neighbors"]
+            )
+
+            served = MovieRecommender(similarity="topk")
+            served.load_dataset(dataset, Path(tmpdir) / "neighbors")
+            self.assertEqual(served.top_k, 8)
+            self.assertEqual(served.neighbors.indices.dtype, np.int32)
+            self.assertEqual(served.neighbors.scores.dtype, np.float32)
+            for title in df["title"]:
+                self.assertEqual(
+                    served.recommend(title, 8).tolist(),
+                    topk.recommend(title, 8).tolist(),
+                )
+            df.iloc[:50].to_csv(dataset, index=False)
+            with self.assertRaises(ValueError):
+                MovieRecommender(similarity="topk").load_dataset(
+                    dataset, Path(tmpdir) / "neighbors"
+                )
+
+    def test_query_mode_matches_dense(self) -> None:
+        """Query-time similarity should rank movies like the dense matrix."""
+        df = make_movies(60, seed=1)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            dense = MovieRecommender()
+            dense.load_dataset(tmp.name)
+            query = MovieRecommender(similarity="query")
+            query.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        self.assertIsNone(query.cosine_sim)
+        self.assertIsNone(query.neighbors)
+        for title in df["title"]:
+            self.assertEqual(
+                query.recommend(title, 10).tolist(),
+                dense.recommend(title, 10).tolist(),
+            )
+
+    def test_ann_mode_matches_query(self) -> None:
+        """With every movie as a candidate, ANN should rank like query mode."""
+        df = make_movies(60, seed=1)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            query = MovieRecommender(similarity="query")
+            query.load_dataset(tmp.name)
+            ann = MovieRecommender(
+                similarity="ann", ann_bands=64, ann_rows=1, ann_candidates=1000
+            )
+            ann.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        for title in df["title"]:
+            self.assertEqual(
+                ann.recommend(title, 5).tolist(),
+                query.recommend(title, 5).tolist(),
+            )
+        report = recall_report(
+            query.features, [{"bands": 64, "rows": 1, "max_candidates": 1000}], k=5
+        )
+        self.assertEqual(report["recall@5"].tolist(), [1.0])
+
+    def test_recommend_several_titles(self) -> None:
+        """Several seeds should rank movies by similarity to their sum."""
+        df = make_movies(50, seed=6)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            dense = MovieRecommender()
+            dense.load_dataset(tmp.name)
+            query = MovieRecommender(similarity="query")
+            query.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        seeds = ["Movie 1", "Movie 7", "Movie 20"]
+        rows = dense.indices[seeds].to_numpy()
+        profile = np.asarray(dense.features[rows].sum(axis=0)).ravel()
+        sim = dense.features @ profile
+        sim[rows] = -np.inf
+        expected = dense.df["title"].iloc[top_k_indices(sim, 8)[0]].tolist()
+        for rec in (dense, query):
+            result = rec.recommend(titles=seeds, top_n=8).tolist()
+            self.assertEqual(result, expected)
+            self.assertFalse(set(result) & set(seeds))
+        with self.assertRaises(ValueError):
+            dense.recommend("Movie 1", titles=seeds)
+
+    def test_add_and_update_movies_incrementally(self) -> None:
+        """Added and updated movies should score like a full rebuild."""
+        df = make_movies(60, seed=4)
+        updated = df.copy()
+        updated.loc[3, "actors"] = "['Actor 1', 'New Actor']"
+        paths = {}
+        for name, frame in (("part", df.iloc[:50]), ("all", df), ("new", updated)):
+            with tempfile.NamedTemporaryFile(
+                suffix=".csv", delete=False, mode="w+"
+            ) as tmp:
+                frame.to_csv(tmp.name, index=False)
+            paths[name] = tmp.name
+        try:
+            expected = {}
+            for name, similarity in (
+                ("all", "dense"),
+                ("all", "topk"),
+                ("new", "dense"),
+            ):
+                rec = MovieRecommender(similarity=similarity, top_k=10)
+                rec.load_dataset(paths[name])
+                expected[name, similarity] = rec
+            dense = MovieRecommender()
+            dense.load_dataset(paths["part"])
+            topk = MovieRecommender(similarity="topk", top_k=10)
+            topk.load_dataset(paths["part"])
+        finally:
+            for path in paths.values():
+                os.unlink(path)
+
+        dense.recommend("Movie 1")
+        rows = dense.add_movies(df.iloc[50:])
+        topk.add_movies(df.iloc[50:])
+        self.assertEqual(rows.tolist(), list(range(50, 60)))
+        np.testing.assert_allclose(
+            dense.cosine_sim, expected["all", "dense"].cosine_sim
+        )
+        np.testing.assert_allclose(
+            topk.neighbors.scores, expected["all", "topk"].neighbors.scores, atol=1e-6
+        )
+        self.assertEqual(
+            dense.recommend("Movie 55", 5).tolist(),
+            expected["all", "dense"].recommend("Movie 55", 5).tolist(),
+        )
+
+        self.assertEqual(
+            dense.update_movie("Movie 3", actors=["Actor 1", "New Actor"]), 3
+        )
+        np.testing.assert_allclose(
+            dense.cosine_sim, expected["new", "dense"].cosine_sim
+        )
+        with self.assertRaises(ValueError):
+            dense.update_movie("Movie 3", budget=10)
+        dense.compact()
+        self.assertEqual(
+            list(dense.vectorizer.get_feature_names_out()),
+            list(expected["new", "dense"].vectorizer.get_feature_names_out()),
+        )
+
+    def test_update_movie_renames_and_dates_a_movie(self) -> None:
+        """Title, year and tconst should be updatable like other columns."""
+        df = make_movies(20, seed=5)
+        df["year"] = 2000
+        df["tconst"] = [f"tt{i:07d}" for i in range(len(df))]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = Path(tmpdir) / "movies.csv"
+            df.to_csv(dataset, index=False)
+            rec = MovieRecommender()
+            rec.load_dataset(dataset)
+        expected = rec.recommend("Movie 2", 5).tolist()
+        rec.recommend("Movie 4")
+
+        row = rec.update_movie("Movie 2", title="Heat 2", year=2026, tconst="tt9")
+        self.assertEqual(row, 2)
+        self.assertEqual(rec.resolve("Heat 2"), 2)
+        self.assertEqual(rec.resolve("Heat 2 (2026)"), 2)
+        self.assertEqual(rec.resolve("anything", tconst="tt9"), 2)
+        self.assertEqual(rec.recommend("Heat 2", 5).tolist(), expected)
+        self.assertIn("Heat 2", rec.recommend("Movie 4", 19).tolist())
+        with self.assertRaises(ValueError):
+            rec.resolve("Movie 2")
+        self.assertEqual(
+            rec.update_movie("Heat 2", match_year=2026, title="Heat Two"), 2
+        )
+        self.assertEqual(rec.update_movie(2, year=None), 2)
+        self.assertEqual(rec.find_titles("heat two")["label"].tolist(), ["Heat Two"])
+        with self.assertRaises(ValueError):
+            rec.update_movie(20, title="Nowhere")
+
+    def test_result_cache_bounds_and_stats(self) -> None:
+        """The cache should evict, expire and count hits and misses."""
+        now = [0.0]
+        cache = ResultCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        now[0] = 11
+        self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual(
+            (stats.hits, stats.misses, stats.evictions, stats.expirations),
+            (1, 2, 1, 1),
+        )
+        self.assertEqual(stats.size, 1)
+
+    def test_recommend_uses_result_cache(self) -> None:
+        """Repeated calls should be served from the cache until a reload."""
+        df = make_movies(30, seed=7)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            rec = MovieRecommender(similarity="query", cache_size=8)
+            rec.load_dataset(tmp.name)
+            first = rec.recommend("Movie 2", 5)
+            with unittest.mock.patch.object(rec, "_rank") as rank:
+                second = rec.recommend("Movie 2", 5)
+            rank.assert_not_called()
+            self.assertEqual(first.tolist(), second.tolist())
+            self.assertEqual(rec.result_cache.stats().hits, 1)
+            rec.load_dataset(tmp.name)
+            self.assertEqual(len(rec.result_cache), 0)
+        finally:
+            os.unlink(tmp.name)
+
+    def test_metrics_record_stages_and_latency(self) -> None:
+        """Enabled metrics should time every load stage and each recommend."""
+        df = make_movies(30, seed=3)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        instrumentation.METRICS.reset()
+        instrumentation.enable()
+        try:
+            rec = MovieRecommender(similarity="query")
+            with self.assertLogs("src.instrumentation", "INFO") as logs:
+                rec.load_dataset(tmp.name)
+            rec.recommend("Movie 2", 5)
+            text = instrumentation.render_prometheus()
+        finally:
+            instrumentation.enable(False)
+            instrumentation.METRICS.reset()
+            os.unlink(tmp.name)
+        self.assertIn('"stage": "load:vectorizer_fit"', "\n".join(logs.output))
+        self.assertIn('movies_stage_calls_total{stage="load:read"} 1', text)
+        self.assertIn('movies_stage_rows_out_total{stage="load:read"} 30', text)
+        self.assertIn('movies_stage_calls_total{stage="load:similarity:query"} 1', text)
+        self.assertIn(
+            'movies_recommend_seconds_bucket{similarity="query",le="+Inf"} 1', text
+        )
+        self.assertIn('movies_recommend_seconds_count{similarity="query"} 1', text)
+        self.assertIn('movies_stage_peak_rss_growth_bytes{stage="load:read"}', text)
+
+    def test_metrics_without_peak_rss(self) -> None:
+        """Platforms without ``resource`` should report no peak RSS."""
+        instrumentation.METRICS.reset()
+        instrumentation.enable()
+        try:
+            with unittest.mock.patch.object(instrumentation, "resource", None):
+                with self.assertLogs("src.instrumentation", "INFO") as logs:
+                    with instrumentation.stage("test", 3) as record:
+                        record.rows_out = 2
+            text = instrumentation.render_prometheus()
+        finally:
+            instrumentation.enable(False)
+            instrumentation.METRICS.reset()
+        self.assertIsNone(json.loads(logs.records[0].getMessage())["peak_rss_growth_bytes"])
+        self.assertIn('movies_stage_calls_total{stage="test"} 1', text)
+        self.assertNotIn('movies_stage_peak_rss_growth_bytes{stage="test"}', text)
+
+    def test_recommend_many_matches_recommend(self) -> None:
+        """Batched recommendations should equal one call per title."""
+        df = make_movies(40, seed=2)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            rec = MovieRecommender()
+            rec.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        titles = ["Movie 3", "Movie 0", "Movie 17"]
+        result = rec.recommend_many(titles, top_n=5)
+        self.assertEqual(list(result.columns), ["query", "rank", "title", "score"])
+        for title in titles:
+            sim_scores = sorted(
+                enumerate(rec.cosine_sim[rec.indices[title]]),
+                key=lambda x: x[1],
+                reverse=True,
+            )
+            expected = rec.df["title"].iloc[[i for i, _ in sim_scores[1:6]]].tolist()
+            rows = result[result["query"] == title]
+            self.assertEqual(rows["title"].tolist(), expected)
+            self.assertEqual(rec.recommend(title, 5).tolist(), expected)
+            self.assertEqual(rows["rank"].tolist(), [1, 2, 3, 4, 5])
+        with self.assertRaises(ValueError):
+            rec.recommend_many(["Movie 1", "Missing"])
+
+    def test_recommend_many_resolves_like_recommend(self) -> None:
+        """Non-exact and duplicate titles should pick the same movie in both."""
+        df = make_movies(40, seed=2)
+        df.loc[20, "title"] = "Movie 3"
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False, mode="w+") as tmp:
+            df.to_csv(tmp.name, index=False)
+        try:
+            rec = MovieRecommender()
+            rec.load_dataset(tmp.name)
+        finally:
+            os.unlink(tmp.name)
+        titles = ["movie 3", "MOVIE-17", "Movie 3"]
+        result = rec.recommend_many(titles, top_n=5)
+        for title in titles:
+            self.assertEqual(
+                result.loc[result["query"] == title, "title"].tolist(),
+                rec.recommend(title, 5).tolist(),
+            )
+
+    def test_iter_recommendations_reports_missing_titles(self) -> None:
+        """Streamed batches should keep input order and report failures."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = Path(tmpdir) / "movies.csv"
+            make_movies(40, seed=2).to_csv(dataset, index=False)
+            rec = MovieRecommender(similarity="topk", top_k=5)
+            rec.load_dataset(dataset)
+        titles = ["Movie 3", "Missing", "movie 0", "Movie 3"]
+        frames = list(rec.iter_recommendations(iter(titles), top_n=3, batch_size=3))
+        result = pd.concat(frames, ignore_index=True)
+        self.assertEqual([len(frame) for frame in frames], [7, 3])
+        self.assertEqual(
+            list(result.columns), ["query", "rank", "title", "score", "error"]
+        )
+        self.assertEqual(
+            result["query"].tolist(),
+            ["Movie 3"] * 3 + ["Missing"] + ["movie 0"] * 3 + ["Movie 3"] * 3,
+        )
+        missing = result.loc[result["query"] == "Missing"].iloc[0]
+        self.assertTrue(pd.isna(missing["rank"]))
+        self.assertIn("not in the dataset", missing["error"])
+        found = result.loc[result["query"] == "movie 0"]
+        self.assertEqual(found["title"].tolist(), rec.recommend("Movie 0", 3).tolist())
+        self.assertEqual(found["rank"].tolist(), [1, 2, 3])
+        self.assertTrue(found["error"].isna().all())
+
+    def test_save_and_load_model(self) -> None:
+        """A saved model should reload with identical recommendations."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = Path(tmpdir) / "movies.csv"
+            model_path = Path(tmpdir) / "model"
+            make_movies(30, seed=3).to_csv(dataset, index=False)
+            for similarity in ("dense", "topk", "query", "ann"):
+                rec = MovieRecommender(similarity=similarity, top_k=5)
+                rec.load_dataset(dataset)
+                rec.save_model(model_path)
+                loaded = MovieRecommender.load_model(model_path)
+                self.assertEqual(loaded.similarity, similarity)
+                pd.testing.assert_frame_equal(loaded.df, rec.df)
+                self.assertEqual(
+                    loaded.recommend("Movie 4", 5).tolist(),
+                    rec.recommend("Movie 4", 5).tolist(),
+                )
+
+    def test_load_or_build_builds_once_for_all_workers(self) -> None:
+        """Concurrent workers should share one build of a memory-mapped model."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = str(Path(tmpdir) / "movies.csv")
+            model_path = str(Path(tmpdir) / "model")
+            log_path = str(Path(tmpdir) / "builds.log")
+            make_movies(200, seed=8).to_csv(dataset, index=False)
+            with ProcessPoolExecutor(max_workers=3) as pool:
+                futures = [
+                    pool.submit(load_shared_model, dataset, model_path, log_path)
+                    for _ in range(3)
+                ]
+                mapped = [future.result() for future in futures]
+            builds = Path(log_path).read_text().splitlines()
+        self.assertEqual(mapped, [True, True, True])
+        self.assertEqual(len(builds), 1)
+
+    def test_load_or_build_rebuilds_stale_model(self) -> None:
+        """Changing the dataset should invalidate the saved model."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = Path(tmpdir) / "movies.csv"
+            model_path = Path(tmpdir) / "model"
+            make_movies(20, seed=4).to_csv(dataset, index=False)
+            MovieRecommender.load_or_build(dataset, model_path)
+            with unittest.mock.patch.object(
+                MovieRecommender, "load_dataset"
+            ) as mock_load:
+                rec = MovieRecommender.load_or_build(dataset, model_path)
+            mock_load.assert_not_called()
+            self.assertEqual(len(rec.df), 20)
+
+            make_movies(25, seed=4).to_csv(dataset, index=False)
+            rec = MovieRecommender.load_or_build(dataset, model_path)
+            self.assertEqual(len(rec.df), 25)
+            self.assertEqual(len(MovieRecommender.load_model(model_path).df), 25)
+
+    def test_prepare_features_is_faster_with_same_tokens(self) -> None:
+        """Vectorized preparation should beat the row-wise helpers."""
+        df = make_large_movies(100_000)
+        df.loc[0, "director"] = np.nan
+        df.loc[1, "actors"] = np.nan
+        df.loc[2, "director"] = "Jean-Luc O'Neil"
+
+        start = time.perf_counter()
+        rowwise = df.copy()
+        rowwise["director"] = rowwise["director"].apply(lambda x: [x, x])
+        for column in ["actors", "genres", "director"]:
+            rowwise[column] = (
+                rowwise[column].astype("str").apply(MovieRecommender.clean_data)
+            )
+        rowwise_soup = rowwise.apply(MovieRecommender.create_soup, axis=1)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorized_soup = MovieRecommender.prepare_features(df)["soup"]
+        vectorized_time = time.perf_counter() - start
+
+        self.assertLess(vectorized_time, rowwise_time / 2)
+        analyzer = CountVectorizer(stop_words="english").build_analyzer()
+        for old, new in zip(rowwise_soup, vectorized_soup):
+            self.assertEqual(sorted(analyzer(old)), sorted(analyzer(new)))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,6 +2,8 @@ import os
 import sys
 import tempfile
 import unittest
+from io import StringIO
+from unittest.mock import patch
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if BASE_DIR not in sys.path:
@@ -14,9 +16,16 @@ from django.test.utils import setup_test_environment
 setup_test_environment()
 
 import pandas as pd
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
 
+from movies import views
+from movies.models import Movie, Neighbor
 from movies.views import _load_recommender
+from src import instrumentation
+from src.movie_recommender import MovieRecommender
 
 
 @override_settings(ALLOWED_HOSTS=["testserver"])
@@ -25,9 +34,11 @@ class SearchViewTest(TestCase):
 
     def setUp(self) -> None:
         _load_recommender.cache_clear()
+        cache.clear()
         self.client = Client()
 
-    def create_dataset(self) -> str:
+    @staticmethod
+    def create_dataset() -> str:
         df = pd.DataFrame(
             {
                 "title": ["Movie A", "Movie B", "Movie C"],
@@ -61,6 +72,18 @@ class SearchViewTest(TestCase):
         finally:
             os.unlink(dataset_path)
 
+    def test_search_combines_several_titles(self) -> None:
+        """Posting several titles should recommend for all of them at once."""
+        dataset_path = self.create_dataset()
+        try:
+            with override_settings(RECOMMENDER_DATASET_PATH=dataset_path):
+                response = self.client.post("/", {"title": ["Movie A", "Movie B", ""]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context["recommendations"]), ["Movie C"])
+            self.assertIsNone(response.context["error"])
+        finally:
+            os.unlink(dataset_path)
+
     def test_search_missing_dataset_shows_error(self) -> None:
         """An error message should be shown when the dataset is missing."""
         missing_path = "/tmp/does_not_exist.csv"
@@ -70,3 +93,184 @@ class SearchViewTest(TestCase):
         self.assertIsNone(response.context["recommendations"])
         self.assertIn("Dataset not found", response.context["error"])
 
+    def test_autocomplete_returns_matching_titles(self) -> None:
+        """The autocomplete route should return JSON title suggestions."""
+        dataset_path = self.create_dataset()
+        try:
+            with override_settings(RECOMMENDER_DATASET_PATH=dataset_path):
+                response = self.client.get("/autocomplete/", {"q": "movie b"})
+                empty = self.client.get("/autocomplete/", {"q": ""})
+        finally:
+            os.unlink(dataset_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"][0], {"title": "Movie B", "label": "Movie B"}
+        )
+        self.assertEqual(empty.json(), {"results": []})
+
+    def test_api_recommend_supports_conditional_requests(self) -> None:
+        """The JSON API should send validators and honor If-None-Match."""
+        dataset_path = self.create_dataset()
+        try:
+            with override_settings(RECOMMENDER_DATASET_PATH=dataset_path):
+                response = self.client.get(
+                    "/api/recommend", {"title": "Movie A", "top_n": 2}
+                )
+                etag = response["ETag"]
+                cached = self.client.get(
+                    "/api/recommend",
+                    {"title": "Movie A", "top_n": 2},
+                    HTTP_IF_NONE_MATCH=etag,
+                )
+                other = self.client.get(
+                    "/api/recommend", {"title": "Movie A", "top_n": 1}
+                )
+                with patch.object(MovieRecommender, "recommend") as recommend:
+                    repeated = self.client.get(
+                        "/api/recommend", {"title": "Movie A", "top_n": 2}
+                    )
+                recommend.assert_not_called()
+                missing = self.client.get(
+                    "/api/recommend", {"title": "Nope"}, HTTP_IF_NONE_MATCH="*"
+                )
+                invalid = self.client.get("/api/recommend", {"top_n": 2})
+                respelled = self.client.get(
+                    "/api/recommend", {"title": "movie a", "top_n": 2}
+                )
+                head = self.client.head(
+                    "/api/recommend", {"title": "Movie A", "top_n": 2}
+                )
+        finally:
+            os.unlink(dataset_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [movie["title"] for movie in response.json()["results"]],
+            ["Movie B", "Movie C"],
+        )
+        self.assertIn("Last-Modified", response)
+        self.assertIn("max-age=300", response["Cache-Control"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(repeated.json(), response.json())
+        self.assertNotEqual(other["ETag"], etag)
+        self.assertEqual(missing.status_code, 404)
+        self.assertNotIn("ETag", missing)
+        self.assertNotIn("Last-Modified", missing)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(respelled["ETag"], etag)
+        self.assertEqual(respelled.json()["query"], ["movie a"])
+        self.assertEqual(respelled.json()["results"], response.json()["results"])
+        self.assertEqual(head.status_code, 200)
+        self.assertEqual(head["ETag"], etag)
+
+    def test_api_recommend_parses_query_once(self) -> None:
+        """The validators and the view should share one parse of the query."""
+        dataset_path = self.create_dataset()
+        try:
+            with override_settings(RECOMMENDER_DATASET_PATH=dataset_path):
+                with patch(
+                    "movies.views._parse_api_query", wraps=views._parse_api_query
+                ) as parse:
+                    response = self.client.get("/api/recommend", {"title": "Movie A"})
+        finally:
+            os.unlink(dataset_path)
+        self.assertEqual(response.status_code, 200)
+        parse.assert_called_once()
+
+    def test_api_recommend_rejects_top_n_above_top_k(self) -> None:
+        """In topk mode a top_n past the stored neighbors is a bad request."""
+        dataset_path = self.create_dataset()
+        try:
+            with override_settings(
+                RECOMMENDER_DATASET_PATH=dataset_path,
+                RECOMMENDER_SIMILARITY="topk",
+                RECOMMENDER_TOP_K=1,
+            ):
+                too_many = self.client.get(
+                    "/api/recommend", {"title": "Movie A", "top_n": 2}
+                )
+                allowed = self.client.get(
+                    "/api/recommend", {"title": "Movie A", "top_n": 1}
+                )
+        finally:
+            os.unlink(dataset_path)
+        self.assertEqual(too_many.status_code, 400)
+        self.assertEqual(too_many.json(), {"error": "top_n must be between 1 and 1."})
+        self.assertNotIn("ETag", too_many)
+        self.assertNotIn("Last-Modified", too_many)
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(len(allowed.json()["results"]), 1)
+
+    def test_metrics_endpoint(self) -> None:
+        """/metrics should serve Prometheus text only when enabled."""
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        instrumentation.METRICS.reset()
+        instrumentation.enable()
+        try:
+            with instrumentation.stage("test", 3) as record:
+                record.rows_out = 2
+            with override_settings(RECOMMENDER_METRICS=True):
+                response = self.client.get("/metrics")
+        finally:
+            instrumentation.enable(False)
+            instrumentation.METRICS.reset()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn('movies_stage_rows_in_total{stage="test"} 3', body)
+        self.assertIn('movies_stage_rows_out_total{stage="test"} 2', body)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class CatalogTest(TestCase):
+    """Tests for the database catalog and the ``database`` backend."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Plain pytest runs without Django's test runner and its test database.
+        cls.old_name = None
+        if Movie._meta.db_table not in connection.introspection.table_names():
+            cls.old_name = connection.creation.create_test_db(verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        if cls.old_name is not None:
+            connection.creation.destroy_test_db(cls.old_name, verbosity=0)
+
+    def test_search_reads_neighbors_from_database(self) -> None:
+        """load_catalog should store neighbors the search view serves."""
+        dataset_path = SearchViewTest.create_dataset()
+        try:
+            call_command(
+                "load_catalog",
+                dataset=dataset_path,
+                top_k=2,
+                batch_size=2,
+                stdout=StringIO(),
+            )
+        finally:
+            os.unlink(dataset_path)
+        self.assertEqual(Movie.objects.count(), 3)
+        self.assertEqual(Neighbor.objects.count(), 6)
+        self.assertEqual(Movie.objects.titled("movie a").get().title, "Movie A")
+
+        client = Client()
+        with override_settings(RECOMMENDER_BACKEND="database"):
+            with self.assertNumQueries(1):
+                response = client.post("/", {"title": "Movie A"})
+            combined = client.post("/", {"title": ["Movie A", "Movie B"]})
+            missing = client.post("/", {"title": "Nope"})
+            with patch("movies.views.get_recommender") as get_recommender:
+                with self.assertNumQueries(1):
+                    suggestions = client.get("/autocomplete/", {"q": "MOVIE"})
+            get_recommender.assert_not_called()
+        self.assertEqual(
+            [movie["label"] for movie in suggestions.json()["results"]],
+            ["Movie A", "Movie B", "Movie C"],
+        )
+        self.assertEqual(
+            list(response.context["recommendations"]), ["Movie B", "Movie C"]
+        )
+        self.assertEqual(list(combined.context["recommendations"]), ["Movie C"])
+        self.assertIn("not in the dataset", missing.context["error"])
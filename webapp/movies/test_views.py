@@ -1,6 +1,7 @@
 import os
 import sys
 import tempfile
+import threading
 import unittest
 from unittest.mock import patch
 
@@ -14,7 +15,9 @@ django.setup()
 import pandas as pd
 from django.test import SimpleTestCase, override_settings
 
-from movies.views import get_recommender, _load_recommender
+from movies.apps import MoviesConfig, warm_up
+from movies.reloader import ReloadingRecommender
+from movies.views import get_recommender, _build_recommender, _load_recommender
 
 
 class GetRecommenderTest(SimpleTestCase):
@@ -37,7 +40,8 @@ class GetRecommenderTest(SimpleTestCase):
             df.to_csv(tmp.name, index=False)
         try:
             with override_settings(RECOMMENDER_DATASET_PATH=tmp.name):
-                with patch("src.movie_recommender.MovieRecommender.load_dataset") as mock_load:
+                with patch("src.movie_recommender.MovieRecommender.load_dataset") as mock_load, \
+                        patch("src.movie_recommender.MovieRecommender.title_index"):
                     mock_load.return_value = df
                     rec1 = get_recommender()
                     rec2 = get_recommender()
@@ -46,6 +50,90 @@ class GetRecommenderTest(SimpleTestCase):
         finally:
             os.unlink(tmp.name)
 
+    def test_reload_swaps_model_in_background(self):
+        def write(titles):
+            pd.DataFrame(
+                {
+                    "title": titles,
+                    "director": ["Director A"] * len(titles),
+                    "genres": ["Drama"] * len(titles),
+                    "score": [9.0] * len(titles),
+                    "actors": ["Actor X"] * len(titles),
+                }
+            ).to_csv(path, index=False)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "movies.csv")
+            write(["Movie A", "Movie B"])
+            release = threading.Event()
+
+            def build():
+                recommender = _build_recommender(path, "dense", 50, None, 0, None)
+                release.wait(10)
+                return recommender
+
+            release.set()
+            holder = ReloadingRecommender(path, build, interval=0)
+            old = holder.recommender
+            release.clear()
+            write(["Movie A", "Movie B", "Movie C"])
+            os.utime(path, ns=(0, 0))
+            self.assertIs(holder.recommender, old)
+            release.set()
+            holder.wait()
+            new = holder.recommender
+        self.assertIsNot(new, old)
+        self.assertEqual(len(old.df), 2)
+        self.assertEqual(len(new.df), 3)
+        self.assertIsNotNone(new._title_index)
+
+
+class WarmUpTest(SimpleTestCase):
+    """Tests for building the recommender before the first request."""
+
+    def setUp(self):
+        _load_recommender.cache_clear()
+
+    def test_only_server_processes_warm_up(self):
+        config = django.apps.apps.get_app_config("movies")
+        commands = {
+            ("pytest", "-q"): False,
+            ("django-admin", "runserver"): False,
+            ("manage.py", "migrate"): False,
+            ("manage.py", "runserver"): False,
+            ("manage.py", "runserver", "--noreload"): True,
+        }
+        for argv, expected in commands.items():
+            with self.subTest(argv=argv):
+                with patch.object(sys, "argv", list(argv)), \
+                        patch.dict(os.environ, {"RUN_MAIN": ""}), \
+                        patch("movies.apps.warm_up") as mock_warm_up:
+                    MoviesConfig.ready(config)
+                self.assertEqual(mock_warm_up.called, expected)
+
+    def test_warm_up_builds_title_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "movies.csv")
+            pd.DataFrame(
+                {
+                    "title": ["Movie A", "Movie B"],
+                    "director": ["Director A", "Director B"],
+                    "genres": ["Drama", "Drama"],
+                    "score": [9.0, 8.0],
+                    "actors": ["Actor X", "Actor Y"],
+                }
+            ).to_csv(path, index=False)
+            with override_settings(RECOMMENDER_DATASET_PATH=path):
+                warm_up()
+                recommender = get_recommender()
+        self.assertIsNotNone(recommender._title_index)
+
+    def test_warm_up_skips_database_backend(self):
+        with override_settings(RECOMMENDER_BACKEND="database"), \
+                patch("movies.views.get_recommender") as mock_get:
+            warm_up()
+        mock_get.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('api/recommend', views.api_recommend, name='api_recommend'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,40 +1,125 @@
 """Views for the movie recommendation app."""
 
-from functools import lru_cache
+import hashlib
+from datetime import datetime, timezone
+from functools import lru_cache, partial
 from pathlib import Path
 
+import pandas as pd
 from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET, require_safe
 
+from src import instrumentation
 from src.movie_recommender import MovieRecommender
 
+from .models import Movie, Neighbor
+from .reloader import ReloadingRecommender
 
-@lru_cache(maxsize=1)
-def _load_recommender(dataset: str) -> MovieRecommender:
-    """Return a recommender with ``dataset`` loaded."""
-    recommender = MovieRecommender()
-    recommender.load_dataset(dataset)
+# Most suggestions returned by ``autocomplete``.
+MAX_SUGGESTIONS = 50
+# Most recommendations returned by ``api_recommend``.
+MAX_TOP_N = 100
+
+
+def _build_recommender(
+    dataset: str,
+    similarity: str,
+    top_k: int,
+    model_path: str | None,
+    cache_size: int,
+    cache_ttl: float | None,
+) -> MovieRecommender:
+    """Return a recommender with ``dataset`` loaded.
+
+    When ``model_path`` is given the saved model is opened instead, and only
+    rebuilt if ``dataset`` changed since it was written. The title index used
+    by the search box is built here too, so neither the first request nor the
+    first one after a reload has to wait for it.
+    """
+    options = {
+        "similarity": similarity,
+        "top_k": top_k,
+        "cache_size": cache_size,
+        "cache_ttl": cache_ttl,
+    }
+    if model_path:
+        recommender = MovieRecommender.load_or_build(dataset, model_path, **options)
+    else:
+        recommender = MovieRecommender(**options)
+        recommender.load_dataset(dataset)
+    recommender.title_index
     return recommender
 
 
+@lru_cache(maxsize=1)
+def _load_recommender(
+    dataset: str,
+    similarity: str = "dense",
+    top_k: int = 50,
+    model_path: str | None = None,
+    cache_size: int = 0,
+    cache_ttl: float | None = None,
+    reload_interval: float | None = None,
+) -> ReloadingRecommender:
+    """Return the :class:`ReloadingRecommender` serving ``dataset``.
+
+    The first call for a set of arguments builds the model; later changes to
+    the dataset file are picked up in the background.
+    """
+    build = partial(
+        _build_recommender,
+        dataset,
+        similarity,
+        top_k,
+        model_path,
+        cache_size,
+        cache_ttl,
+    )
+    return ReloadingRecommender(dataset, build, reload_interval)
+
+
 def get_recommender() -> MovieRecommender:
-    """Return a cached :class:`MovieRecommender` instance."""
+    """Return the current :class:`MovieRecommender` instance."""
     dataset_path = Path(settings.RECOMMENDER_DATASET_PATH)
     if not dataset_path.exists():
         raise ValueError("Dataset not found. Please run dataset reducer.")
-    return _load_recommender(str(dataset_path))
+    return _load_recommender(
+        str(dataset_path),
+        settings.RECOMMENDER_SIMILARITY,
+        settings.RECOMMENDER_TOP_K,
+        settings.RECOMMENDER_MODEL_PATH and str(settings.RECOMMENDER_MODEL_PATH),
+        settings.RECOMMENDER_CACHE_SIZE,
+        settings.RECOMMENDER_CACHE_TTL,
+        settings.RECOMMENDER_RELOAD_INTERVAL,
+    ).recommender
 
 
 def search(request):
-    """Render the search form and show recommendations."""
+    """Render the search form and show recommendations.
+
+    Several ``title`` fields may be posted; their movies are then combined
+    into one query. With ``RECOMMENDER_BACKEND = "database"`` the answer comes
+    from the precomputed neighbors in the database instead of a model held in
+    memory.
+    """
     recommendations = None
     error = None
     if request.method == "POST":
-        title = request.POST.get("title", "")
-        if title:
+        titles = [title for title in request.POST.getlist("title") if title.strip()]
+        if titles:
             try:
-                recommender = get_recommender()
-                recommendations = recommender.recommend(title).tolist()
+                if settings.RECOMMENDER_BACKEND == "database":
+                    recommendations = Neighbor.objects.recommend(titles)
+                elif len(titles) == 1:
+                    recommendations = get_recommender().recommend(titles[0]).tolist()
+                else:
+                    recommendations = (
+                        get_recommender().recommend(titles=titles).tolist()
+                    )
             except Exception as exc:
                 error = str(exc)
     return render(
@@ -42,3 +127,190 @@ def search(request):
         "movies/search.html",
         {"recommendations": recommendations, "error": error},
     )
+
+
+def _json_records(movies: pd.DataFrame) -> list[dict]:
+    """Return the rows of ``movies`` as dicts that JSON can encode."""
+    records = movies.to_dict("records")
+    for record in records:
+        # JSON has no NaN, and years read back as floats.
+        if "year" in record:
+            record["year"] = None if pd.isna(record["year"]) else int(record["year"])
+    return records
+
+
+def autocomplete(request):
+    """Return JSON title suggestions for the ``q`` query parameter.
+
+    Each result holds the ``title``, a ``label`` that adds the year and that
+    the search form accepts, and the ``year`` and ``tconst`` when known. With
+    ``RECOMMENDER_BACKEND = "database"`` titles starting with ``q`` are looked
+    up in the catalog, so no model is loaded.
+    """
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(int(request.GET.get("limit", 10)), MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer."}, status=400)
+    if not query or limit < 1:
+        return JsonResponse({"results": []})
+    if settings.RECOMMENDER_BACKEND == "database":
+        movies = Movie.objects.suggest(query)[:limit]
+        results = [
+            {
+                "title": movie.title,
+                "label": str(movie),
+                "year": movie.year,
+                "tconst": movie.tconst,
+            }
+            for movie in movies
+        ]
+        return JsonResponse({"results": results})
+    try:
+        matches = get_recommender().find_titles(query, limit)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=503)
+    return JsonResponse({"results": _json_records(matches)})
+
+
+def _max_top_n(recommender: MovieRecommender) -> int:
+    """Return the largest ``top_n`` the API answers with ``recommender``.
+
+    In ``topk`` mode only the ``top_k`` stored neighbors of a movie exist.
+    """
+    if recommender.neighbors is not None:
+        return min(MAX_TOP_N, recommender.top_k)
+    return MAX_TOP_N
+
+
+def _api_query(request) -> dict:
+    """Return the parsed, validated and resolved query of an API request.
+
+    The result is stored on ``request`` so the ETag, Last-Modified and view
+    functions share one parse. It holds the HTTP ``status`` and ``error`` of
+    an invalid request, or the ``titles``, ``top_n``, resolved ``rows`` and
+    ``recommender`` of a valid one.
+    """
+    if not hasattr(request, "_recommend_query"):
+        request._recommend_query = _parse_api_query(request)
+    return request._recommend_query
+
+
+def _parse_api_query(request) -> dict:
+    titles = [title for title in request.GET.getlist("title") if title.strip()]
+    if not titles:
+        return {"status": 400, "error": "Pass at least one title."}
+    try:
+        top_n = int(request.GET.get("top_n", 10))
+    except ValueError:
+        return {"status": 400, "error": "top_n must be an integer."}
+    if not 1 <= top_n <= MAX_TOP_N:
+        return {"status": 400, "error": f"top_n must be between 1 and {MAX_TOP_N}."}
+    try:
+        recommender = get_recommender()
+    except ValueError as exc:
+        return {"status": 503, "error": str(exc)}
+    max_top_n = _max_top_n(recommender)
+    if top_n > max_top_n:
+        return {"status": 400, "error": f"top_n must be between 1 and {max_top_n}."}
+    try:
+        rows = [recommender.resolve(title) for title in titles]
+    except ValueError as exc:
+        return {"status": 404, "error": str(exc)}
+    return {
+        "status": 200,
+        "titles": titles,
+        "top_n": top_n,
+        "rows": rows,
+        "recommender": recommender,
+    }
+
+
+def _recommend_etag(request) -> str | None:
+    """Return the ETag of an API request.
+
+    It is derived from the dataset, the similarity settings, ``top_n`` and
+    the resolved movies, so spellings of the same title share it and
+    clients can revalidate cached responses cheaply. Requests that fail get
+    no ETag.
+    """
+    query = _api_query(request)
+    if query["status"] != 200:
+        return None
+    recommender = query["recommender"]
+    version = "\x1f".join(
+        [
+            str(recommender.dataset_hash),
+            recommender.similarity,
+            str(recommender.top_k),
+            str(query["top_n"]),
+            *map(str, query["rows"]),
+        ]
+    )
+    return hashlib.sha256(version.encode("utf-8")).hexdigest()
+
+
+def _recommend_last_modified(request) -> datetime | None:
+    """Return when the dataset served by the API was last written.
+
+    Like the ETag, this is only sent with successful answers.
+    """
+    if _api_query(request)["status"] != 200:
+        return None
+    try:
+        mtime = Path(settings.RECOMMENDER_DATASET_PATH).stat().st_mtime
+    except OSError:
+        return None
+    return datetime.fromtimestamp(mtime, tz=timezone.utc)
+
+
+@require_safe
+@condition(etag_func=_recommend_etag, last_modified_func=_recommend_last_modified)
+def api_recommend(request):
+    """Return recommendations for the ``title`` parameters as JSON.
+
+    Several ``title`` parameters are combined into one query. Results are
+    kept in Django's cache under their ETag and may be cached by clients for
+    ``RECOMMENDER_API_CACHE_SECONDS``; conditional requests are answered
+    with ``304 Not Modified``.
+    """
+    query = _api_query(request)
+    if query["status"] != 200:
+        return JsonResponse({"error": query["error"]}, status=query["status"])
+    titles, top_n, recommender = query["titles"], query["top_n"], query["recommender"]
+
+    key = f"movies:api_recommend:{_recommend_etag(request)}"
+    results = cache.get(key)
+    if results is None:
+        try:
+            if len(titles) == 1:
+                found = recommender.recommend(titles[0], top_n)
+            else:
+                found = recommender.recommend(titles=titles, top_n=top_n)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=404)
+        columns = [
+            name for name in ("title", "year", "tconst") if name in recommender.df
+        ]
+        results = _json_records(recommender.df.loc[found.index, columns])
+        cache.set(key, results, settings.RECOMMENDER_API_CACHE_SECONDS)
+
+    response = JsonResponse({"query": titles, "top_n": top_n, "results": results})
+    patch_cache_control(
+        response, public=True, max_age=settings.RECOMMENDER_API_CACHE_SECONDS
+    )
+    return response
+
+
+@require_GET
+def metrics(request):
+    """Expose stage timings and latency histograms to Prometheus.
+
+    Only available when ``RECOMMENDER_METRICS`` is enabled.
+    """
+    if not settings.RECOMMENDER_METRICS:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(
+        instrumentation.render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from movies.apps import warm_up
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
 
 application = get_asgi_application()
+
+# Build the recommender now so the first request does not wait for it.
+warm_up()
@@ -122,5 +122,43 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Where the search page gets recommendations: "memory" loads the dataset into
+# a MovieRecommender in every worker, "database" reads the neighbors written by
+# `python manage.py load_catalog` with one indexed query per search.
+RECOMMENDER_BACKEND = "memory"
+
 # Location of the reduced movie dataset used by the recommender
 RECOMMENDER_DATASET_PATH = BASE_DIR / "movies_10.csv"
+
+# How the recommender stores similarities: "dense" (full matrix), "topk"
+# (RECOMMENDER_TOP_K neighbors per movie), "query" (computed per request) or
+# "ann" (approximate, computed per request)
+RECOMMENDER_SIMILARITY = "dense"
+RECOMMENDER_TOP_K = 50
+
+# Directory of a saved recommender model. When set, workers open the saved
+# model instead of rebuilding it; it is rebuilt whenever the dataset changes.
+# Only one process builds it, and all workers memory-map the same read-only
+# files, so the model is held in memory once however many workers run.
+RECOMMENDER_MODEL_PATH = None
+
+# Recommendations kept in each worker's in-process LRU cache (0 disables it)
+# and the seconds each entry stays valid (None keeps it until evicted).
+RECOMMENDER_CACHE_SIZE = 1024
+RECOMMENDER_CACHE_TTL = 3600
+
+# Build the recommender when a server process starts instead of on the first
+# request, and check the dataset for changes at most every
+# RECOMMENDER_RELOAD_INTERVAL seconds (None disables reloading). A changed
+# dataset is loaded in a background thread while the old model keeps serving.
+RECOMMENDER_WARMUP = True
+RECOMMENDER_RELOAD_INTERVAL = 2.0
+
+# Seconds that /api/recommend responses stay in Django's cache and in client
+# or CDN caches (Cache-Control max-age).
+RECOMMENDER_API_CACHE_SECONDS = 300
+
+# Record the time, rows and memory of every dataset loading stage and the
+# latency of every recommendation, logged as JSON lines and served in the
+# Prometheus text format at /metrics.
+RECOMMENDER_METRICS = False